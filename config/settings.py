@@ -47,12 +47,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'rental.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'rental.middleware.CartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -70,6 +72,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.i18n',
+                'rental.context_processors.wishlist',
+                'rental.context_processors.roles',
             ],
         },
     },
@@ -135,6 +139,26 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static', 
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'rental.staticfiles.BundleFinder',
+]
+
+# Minified CSS bundles (see rental/staticfiles.py): the shared site sheet and
+# one per page, built from rental/static/rental/css/.
+STATIC_BUNDLES_ROOT = BASE_DIR / 'build' / 'bundles'
+STATIC_BUNDLES = {
+    'rental/css/bundles/site.css': ['rental/css/style.css'],
+    **{
+        f'rental/css/bundles/{page}.css': [f'rental/css/pages/{page}.css']
+        for page in (
+            'about', 'cart', 'checkout', 'contact', 'gallery', 'home', 'login',
+            'my_orders', 'product_detail', 'register', 'reports', 'wishlist',
+        )
+    },
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -145,6 +169,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded media is stored under its content hash (see rental/storage.py), so
+# media URLs never change content: serve MEDIA_URL with
+# "Cache-Control: public, max-age=31536000, immutable".
+STORAGES = {
+    'default': {'BACKEND': 'rental.storage.ContentAddressedStorage'},
+    # Hashed names plus precompressed .gz/.br files, written by collectstatic
+    'staticfiles': {'BACKEND': 'rental.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
 # Redirect to /login/ instead of default /accounts/login/
 LOGIN_URL = '/login/'
 
@@ -152,4 +185,57 @@ LOGIN_URL = '/login/'
 CSRF_COOKIE_SECURE = True
 SESSION_COOKIE_SECURE = True
 SECURE_BROWSER_XSS_FILTER = True
-SECURE_CONTENT_TYPE_NOSNIFF = True
\ No newline at end of file
+SECURE_CONTENT_TYPE_NOSNIFF = True
+
+# Product search backend (see rental/search.py)
+RENTAL_SEARCH_BACKEND = 'rental.search.SQLiteFTS5Backend'
+
+# Catalog cache (see rental/catalog_cache.py). Each process keeps its own
+# copy; the version file tells every worker when Category/Brand/Product change.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+CATALOG_VERSION_FILE = BASE_DIR / '.catalog_version'
+
+# Availability filter (see rental/availability.py)
+AVAILABILITY_VERSION_FILE = BASE_DIR / '.availability_version'
+AVAILABILITY_HORIZON_DAYS = 365
+
+# Per-user wishlist cache versions (see rental/wishlist.py)
+WISHLIST_VERSION_DIR = BASE_DIR / '.wishlist_versions'
+
+# Per-user role versions, checked against the copy in the session (see rental/roles.py)
+ROLES_VERSION_DIR = BASE_DIR / '.role_versions'
+
+# Outgoing mail is sent by the job worker (manage.py run_jobs)
+if DEBUG:
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Cart storage (see rental/cart.py). The signed cookie keeps cart changes
+# off the database entirely but holds about 200 lines. For larger carts use
+# CacheCartStore with a cache shared by every process (Redis/memcached, not
+# LocMem; the system checks refuse one); it is flushed to SavedCart by run_jobs.
+CART_STORE = 'rental.cart.SignedCookieCartStore'
+CART_TTL = 60 * 60 * 24 * 30
+
+# Flash messages in a cookie instead of the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Compressed bytes of anonymous pages are cached by CompressionMiddleware
+# (see rental/middleware.py); Brotli is used when the brotli package is installed.
+COMPRESSION_CACHE_ALIAS = 'default'
+
+# Orders Returned/Cancelled longer ago than this move to ArchivedOrder
+# (see rental/archive.py); they stay visible in the order history.
+ORDER_ARCHIVE_MONTHS = 24
+
+# Registration document uploads (see rental/uploads.py)
+REGISTRATION_MAX_FILE_SIZE = 10 * 1024 * 1024
+REGISTRATION_MAX_UPLOAD_SIZE = 40 * 1024 * 1024
+REGISTRATION_IMAGE_MAX_SIDE = 2000
+
+# Responsive product image widths (see rental/images.py)
+PRODUCT_IMAGE_WIDTHS = (160, 320, 480, 640)
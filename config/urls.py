@@ -1,6 +1,6 @@
 #type:ignore
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.i18n import i18n_patterns
 from rental import views
 from django.conf import settings
@@ -20,9 +20,12 @@ urlpatterns += i18n_patterns(
     path('', views.home, name='home'),
     path('about/', views.about_view, name='about'),
     path('gallery/', views.gallery_view, name='gallery'),
+    path('gallery/more/', views.gallery_fragment, name='gallery_fragment'),
     path('place-order/', views.place_order, name='place_order'),
     path('update-cart/<int:product_id>/', views.update_cart, name='update_cart'),
     path('my_orders/', views.my_orders, name='my_orders'),
+    path('reports/', views.reports_view, name='reports'),
+    path('exports/<slug:name>/', views.export_view, name='export'),
     path('contact/', views.contact_view, name='contact'),
     path('products/', views.gallery_view, name='products'),
 
@@ -39,6 +42,9 @@ urlpatterns += i18n_patterns(
     path('wishlist/', views.wishlist_view, name='wishlist'),
     path('wishlist/add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:item_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
+    path('wishlist/bulk-add/', views.wishlist_bulk_add, name='wishlist_bulk_add'),
+    path('wishlist/bulk-remove/', views.wishlist_bulk_remove, name='wishlist_bulk_remove'),
+    path('wishlist/move-to-cart/', views.wishlist_move_to_cart, name='wishlist_move_to_cart'),
 
     # Product
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
@@ -56,5 +62,5 @@ urlpatterns += i18n_patterns(
 
 # Media files
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), views.serve_media)]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
@@ -1,8 +1,10 @@
 # admin.py
 # type: ignore
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Product, Category, Brand, WishlistItem
-from .models import Order, OrderItem
+from .models import Order, OrderItem, OrderStatusChange, ProductPopularity, Job, RentalFact, ArchivedOrder
+from .orders import bulk_transition
+from . import wishlist
 
 
 
@@ -32,7 +34,7 @@ class StudioProfileAdmin(ProfileAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'brand', 'category', 'price')
+    list_display = ('name', 'brand', 'category', 'price', 'units')
     search_fields = ('name',)
     list_filter = ('brand', 'category')
 
@@ -52,6 +54,58 @@ class WishlistItemAdmin(admin.ModelAdmin):
     list_filter = ('user', 'added_at')
     search_fields = ('product__name', 'user__username')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        wishlist.invalidate(obj.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        wishlist.invalidate(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            wishlist.invalidate(user_id)
+
+
+
+@admin.register(ProductPopularity)
+class ProductPopularityAdmin(admin.ModelAdmin):
+    list_display = ('product', 'category', 'window', 'rentals', 'rental_days', 'updated_at')
+    list_filter = ('window', 'category')
+    search_fields = ('product__name',)
+
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'start_date', 'end_date', 'total_price', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('id', 'user__username')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+
+@admin.register(RentalFact)
+class RentalFactAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product', 'category', 'brand', 'city', 'unit_days', 'revenue')
+    list_filter = ('category', 'brand', 'city')
+    date_hierarchy = 'day'
+
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_at', 'last_error')
+
 
 
 @admin.register(OrderItem)
@@ -72,6 +126,16 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
 
+
+class OrderStatusChangeInline(admin.TabularInline):
+    model = OrderStatusChange
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'changed_at', 'changed_by', 'note']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
@@ -84,4 +148,32 @@ class OrderAdmin(admin.ModelAdmin):
         'delivery_phone', 'delivery_address'
     ]
     date_hierarchy = 'created_at'
-    inlines = [OrderItemInline]
\ No newline at end of file
+    inlines = [OrderItemInline, OrderStatusChangeInline]
+    readonly_fields = ['status']
+    actions = ['mark_confirmed', 'mark_out', 'mark_returned', 'mark_cancelled']
+
+    def _transition(self, request, queryset, status):
+        changed = bulk_transition(queryset, status, by=request.user, note="Admin action")
+        skipped = queryset.count() - changed
+        self.message_user(request, f"{changed} order(s) marked {status}.")
+        if skipped > 0:
+            self.message_user(
+                request, f"{skipped} order(s) skipped: {status} is not allowed from their status.",
+                level=messages.WARNING,
+            )
+
+    @admin.action(description="Mark selected orders Confirmed")
+    def mark_confirmed(self, request, queryset):
+        self._transition(request, queryset, Order.CONFIRMED)
+
+    @admin.action(description="Mark selected orders Out")
+    def mark_out(self, request, queryset):
+        self._transition(request, queryset, Order.OUT)
+
+    @admin.action(description="Mark selected orders Returned")
+    def mark_returned(self, request, queryset):
+        self._transition(request, queryset, Order.RETURNED)
+
+    @admin.action(description="Cancel selected orders")
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, Order.CANCELLED)
\ No newline at end of file
@@ -0,0 +1,230 @@
+# type: ignore
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem, Product, RentalFact, RollupState
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ROLLUP_NAME = 'rental_facts'
+# Orders younger than this are left for the next run, so an order that
+# commits after a higher id was rolled up is not skipped.
+SETTLE_DELAY = timedelta(minutes=1)
+
+ITEM_FIELDS = (
+    'product_id', 'product__category_id', 'product__brand_id', 'order__city',
+    'quantity', 'price', 'order__start_date', 'order__end_date',
+)
+
+
+def aggregate_items(rows):
+    """
+    Explode order lines into rental days and sum them per (day, product, city),
+    vectorized. ``rows`` are tuples in ITEM_FIELDS order. Returns a dict
+    ``{(day, product_id, city): [category_id, brand_id, unit_days, revenue_cents]}``.
+    """
+    if np is None:
+        raise ImproperlyConfigured("The analytics rollups need NumPy installed.")
+    if not rows:
+        return {}
+
+    product, category, brand, city, quantity, price, start, end = zip(*rows)
+    cities, city_code = np.unique(np.array(city, dtype=object).astype(str), return_inverse=True)
+    product = np.array(product, dtype=np.int64)
+    quantity = np.array(quantity, dtype=np.int64)
+    cents = np.array([int(p * 100) for p in price], dtype=np.int64)
+    start = np.array([d.toordinal() for d in start], dtype=np.int64)
+    days = np.maximum(np.array([d.toordinal() for d in end], dtype=np.int64) - start, 1)
+
+    # One element per (line, rental day)
+    line = np.repeat(np.arange(len(rows)), days)
+    offset = np.arange(len(line)) - np.repeat(np.cumsum(days) - days, days)
+    day = start[line] + offset
+
+    keys = np.stack([day, product[line], city_code[line]], axis=1)
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    unit_days = np.bincount(inverse, weights=quantity[line]).astype(np.int64)
+    revenue = np.bincount(inverse, weights=(quantity * cents)[line]).astype(np.int64)
+
+    attributes = {p: (c, b) for p, c, b in zip(product.tolist(), category, brand)}
+    result = {}
+    for (d, p, c), units, cents_total in zip(unique_keys.tolist(), unit_days.tolist(), revenue.tolist()):
+        category_id, brand_id = attributes[p]
+        result[(date.fromordinal(d), p, str(cities[c]))] = [category_id, brand_id, units, cents_total]
+    return result
+
+
+def merge_facts(aggregated, sign=1):
+    """Add (or with ``sign=-1`` subtract) aggregated rows into RentalFact."""
+    if not aggregated:
+        return
+    days = [key[0] for key in aggregated]
+    products = {key[1] for key in aggregated}
+    existing = {
+        (fact.day, fact.product_id, fact.city): fact
+        for fact in RentalFact.objects.filter(day__gte=min(days), day__lte=max(days), product_id__in=products)
+    }
+    to_update, to_create = [], []
+    for (day, product_id, city), (category_id, brand_id, units, cents) in aggregated.items():
+        revenue = Decimal(sign * cents) / 100
+        fact = existing.get((day, product_id, city))
+        if fact:
+            fact.unit_days += sign * units
+            fact.revenue += revenue
+            to_update.append(fact)
+        else:
+            to_create.append(RentalFact(
+                day=day, product_id=product_id, category_id=category_id, brand_id=brand_id,
+                city=city, unit_days=sign * units, revenue=revenue,
+            ))
+    RentalFact.objects.bulk_update(to_update, ['unit_days', 'revenue'], batch_size=1000)
+    RentalFact.objects.bulk_create(to_create, batch_size=1000)
+
+
+def rollup_new_orders(batch_size=2000):
+    """Fold orders placed since the last run into the facts. Returns the number of orders."""
+    total = 0
+    cutoff = timezone.now() - SETTLE_DELAY
+    while True:
+        with transaction.atomic():
+            state, _ = RollupState.objects.select_for_update().get_or_create(name=ROLLUP_NAME)
+            order_ids = list(
+                Order.objects.filter(id__gt=state.last_order_id, created_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return total
+            rows = list(
+                OrderItem.objects.filter(order_id__in=order_ids)
+                .exclude(order__status=Order.CANCELLED)
+                .values_list(*ITEM_FIELDS)
+            )
+            merge_facts(aggregate_items(rows))
+            state.last_order_id = order_ids[-1]
+            state.save(update_fields=['last_order_id', 'updated_at'])
+        total += len(order_ids)
+
+
+def rolled_up(order_ids):
+    """The subset of ``order_ids`` already folded into the facts."""
+    last = RollupState.objects.filter(name=ROLLUP_NAME).values_list('last_order_id', flat=True).first() or 0
+    return [order_id for order_id in order_ids if order_id <= last]
+
+
+def retract_orders(order_ids):
+    """
+    Take orders back out of the facts (e.g. on cancellation). Only pass ids
+    that ``rolled_up`` reported at the time of the change.
+    """
+    with transaction.atomic():
+        rows = list(OrderItem.objects.filter(order_id__in=order_ids).values_list(*ITEM_FIELDS))
+        merge_facts(aggregate_items(rows), sign=-1)
+
+
+def archived_item_rows(orders):
+    """
+    ITEM_FIELDS rows for the lines of ``(items, city, start_date, end_date)``
+    archived orders. Lines of products deleted since are dropped.
+    """
+    product_ids = {line['product_id'] for items, *_ in orders for line in items}
+    attributes = {
+        product_id: (category_id, brand_id)
+        for product_id, category_id, brand_id
+        in Product.objects.filter(id__in=product_ids).values_list('id', 'category_id', 'brand_id')
+    }
+    return [
+        (line['product_id'], *attributes[line['product_id']], city, line['quantity'], Decimal(line['price']),
+         start_date, end_date)
+        for items, city, start_date, end_date in orders
+        for line in items if line['product_id'] in attributes
+    ]
+
+
+def rebuild(batch_size=2000):
+    """Recompute every fact from scratch, archived orders included. Returns the number of orders."""
+    with transaction.atomic():
+        RentalFact.objects.all().delete()
+        RollupState.objects.filter(name=ROLLUP_NAME).delete()
+    total, last_id = 0, 0
+    archived = ArchivedOrder.objects.exclude(status=Order.CANCELLED).order_by('id')
+    while True:
+        orders = list(
+            archived.filter(id__gt=last_id)
+            .values_list('id', 'items', 'city', 'start_date', 'end_date')[:batch_size]
+        )
+        if not orders:
+            break
+        with transaction.atomic():
+            merge_facts(aggregate_items(archived_item_rows([order[1:] for order in orders])))
+        total += len(orders)
+        last_id = orders[-1][0]
+    return total + rollup_new_orders(batch_size)
+
+
+# --------------------------- Reports ---------------------------
+
+DIMENSIONS = {
+    'product': ('product_id', 'product__name'),
+    'category': ('category_id', 'category__name'),
+    'brand': ('brand_id', 'brand__name'),
+    'city': ('city', 'city'),
+}
+PERIODS = {'week': TruncWeek, 'month': TruncMonth}
+
+
+def _period_days(period, bucket, start, end):
+    if period == 'week':
+        last = bucket + timedelta(days=6)
+    else:
+        last = bucket.replace(day=calendar.monthrange(bucket.year, bucket.month)[1])
+    return (min(last, end) - max(bucket, start)).days + 1
+
+
+def report(group, period, start, end):
+    """
+    Revenue, unit-days and utilization per ``group`` per ``period`` between
+    ``start`` and ``end`` (inclusive), from the rollups only. Utilization is
+    rented unit-days over available unit-days (current Product.units);
+    it is not defined for cities.
+    """
+    key, label = DIMENSIONS[group]
+    rows = (
+        RentalFact.objects.filter(day__gte=start, day__lte=end)
+        .annotate(period=PERIODS[period]('day'))
+        .values('period', key, label)
+        .annotate(revenue=Sum('revenue'), unit_days=Sum('unit_days'))
+        .order_by('period', label)
+    )
+
+    capacity = {}
+    if group != 'city':
+        field = 'id' if group == 'product' else key
+        capacity = dict(
+            Product.objects.values(field).annotate(total=Sum('units')).values_list(field, 'total')
+        )
+
+    result = []
+    for row in rows:
+        bucket = row['period']
+        units = capacity.get(row[key])
+        available = units * _period_days(period, bucket, start, end) if units else None
+        result.append({
+            'period': bucket,
+            'label': row[label] or 'Pickup',
+            'revenue': row['revenue'],
+            'unit_days': row['unit_days'],
+            'utilization': row['unit_days'] / available if available else None,
+        })
+    return result
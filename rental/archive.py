@@ -0,0 +1,117 @@
+# type: ignore
+import calendar
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, Job, Order, OrderItem, OrderStatusChange
+from .pagination import KeysetPage, KeysetPaginator
+
+
+CLOSED_STATUSES = (Order.RETURNED, Order.CANCELLED)
+ORDER_FIELDS = (
+    'id', 'user_id', 'created_at', 'is_delivery', 'delivery_name', 'delivery_phone', 'delivery_address',
+    'city', 'zip_code', 'start_date', 'end_date', 'total_price', 'status',
+    'item_count', 'first_product_name', 'first_product_image',
+)
+# Tasks that load the Order row; orders they are still queued for stay put.
+ORDER_TASKS = ('order_placed', 'order_status_changed')
+
+# What the order history list shows
+SUMMARY_FIELDS = (
+    'id', 'created_at', 'start_date', 'end_date', 'status', 'total_price', 'is_delivery',
+    'item_count', 'first_product_name', 'first_product_image',
+)
+
+
+def months_ago(months, today=None):
+    today = today or timezone.localdate()
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    month += 1
+    return today.replace(year=year, month=month, day=min(today.day, calendar.monthrange(year, month)[1]))
+
+
+def archive_orders(months=None, batch_size=500):
+    """
+    Move orders closed (Returned or Cancelled) whose rental ended more than
+    ``months`` ago into ArchivedOrder, one bounded batch per transaction.
+    Orders with ORDER_TASKS jobs still pending or running are skipped until
+    a later run. Returns the number of orders moved.
+    """
+    if months is None:
+        months = getattr(settings, 'ORDER_ARCHIVE_MONTHS', 24)
+    cutoff = months_ago(months)
+    moved, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Order.objects.filter(status__in=CLOSED_STATUSES, end_date__lt=cutoff, id__gt=last_id)
+                .select_for_update()
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                return moved
+            last_id = batch[-1]
+            queued = set(
+                Job.objects.filter(
+                    name__in=ORDER_TASKS, status__in=[Job.PENDING, Job.RUNNING], payload__order_id__in=batch,
+                ).values_list('payload__order_id', flat=True)
+            )
+            ids = [order_id for order_id in batch if order_id not in queued]
+            if not ids:
+                continue
+
+            items, history = {}, {}
+            for item in (
+                OrderItem.objects.filter(order_id__in=ids).order_by('id')
+                .values('order_id', 'product_id', 'product__name', 'quantity', 'price')
+            ):
+                items.setdefault(item.pop('order_id'), []).append({
+                    'product_id': item['product_id'],
+                    'product_name': item['product__name'],
+                    'quantity': item['quantity'],
+                    'price': str(item['price']),
+                })
+            for change in (
+                OrderStatusChange.objects.filter(order_id__in=ids).order_by('changed_at', 'id')
+                .values('order_id', 'from_status', 'to_status', 'changed_at', 'changed_by_id', 'note')
+            ):
+                change['changed_at'] = change['changed_at'].isoformat()
+                history.setdefault(change.pop('order_id'), []).append(change)
+
+            ArchivedOrder.objects.bulk_create([
+                ArchivedOrder(**order, items=items.get(order['id'], []), status_history=history.get(order['id'], []))
+                for order in Order.objects.filter(id__in=ids).values(*ORDER_FIELDS)
+            ], ignore_conflicts=True)
+            # Cascades to OrderItem and OrderStatusChange
+            Order.objects.filter(id__in=ids).delete()
+        moved += len(ids)
+
+
+def order_history_page(user, cursor=None, per_page=20):
+    """
+    One page of a user's order history, newest first, across the hot Order
+    table and ArchivedOrder. Both are read with the same (created_at, id)
+    keyset cursor and merged, so archived orders show up in place.
+    """
+    ordering = ('-created_at', '-id')
+    hot = KeysetPaginator(
+        Order.objects.filter(user=user).only(*SUMMARY_FIELDS), ordering, per_page=per_page,
+    )
+    cold = KeysetPaginator(
+        ArchivedOrder.objects.filter(user=user).only(*SUMMARY_FIELDS), ordering, per_page=per_page,
+    )
+    hot_page, cold_page = hot.page(cursor), cold.page(cursor)
+    if not cold_page.object_list:
+        return hot_page
+    if not hot_page.object_list:
+        return cold_page
+
+    merged = sorted(
+        list(hot_page) + list(cold_page), key=lambda order: (order.created_at, order.id), reverse=True,
+    )
+    rows = merged[:per_page]
+    more = len(merged) > per_page or hot_page.has_next or cold_page.has_next
+    return KeysetPage(rows, hot.encode_cursor(rows[-1]) if more else None)
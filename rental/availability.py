@@ -0,0 +1,191 @@
+# type: ignore
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import notifications
+from .catalog_cache import FileVersionStore
+from .models import Order, OrderItem, ProductOccupancy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Orders in these states no longer hold their units.
+RELEASED_STATUSES = (Order.CANCELLED,)
+
+
+class BookingConflict(Exception):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(p.name for p in products)
+        super().__init__(f"Not available for the selected dates: {names}")
+
+
+def rental_days(start_date, end_date):
+    """Days a rental occupies: start up to (not including) the return day, at least one."""
+    count = max((end_date - start_date).days, 1)
+    return [start_date + timedelta(days=i) for i in range(count)]
+
+
+def _merge(lines):
+    quantities = defaultdict(int)
+    products = {}
+    for product, quantity in lines:
+        quantities[product.pk] += quantity
+        products[product.pk] = product
+    return [(products[pk], qty) for pk, qty in quantities.items()]
+
+
+def reserve(lines, start_date, end_date):
+    """
+    Reserve units for every line or raise BookingConflict. Must run inside the
+    caller's transaction so a conflict rolls back the whole order.
+
+    Each product takes a conditional UPDATE over its day rows
+    (``reserved + q <= units``); if fewer rows than days were updated some day
+    was full. The UPDATE holds the write lock, so two checkouts cannot both
+    take the last unit.
+    """
+    days = rental_days(start_date, end_date)
+    blocked = []
+    for product, quantity in _merge(lines):
+        ProductOccupancy.objects.bulk_create(
+            [ProductOccupancy(product=product, day=day) for day in days],
+            ignore_conflicts=True,
+        )
+        updated = ProductOccupancy.objects.filter(
+            product=product, day__gte=days[0], day__lte=days[-1],
+            reserved__lte=product.units - quantity,
+        ).update(reserved=F('reserved') + quantity)
+        if updated != len(days):
+            blocked.append(product)
+    if blocked:
+        raise BookingConflict(blocked)
+    transaction.on_commit(bump_version)
+
+
+def release(order):
+    """Give back the units held by ``order`` (e.g. when it is cancelled)."""
+    days = rental_days(order.start_date, order.end_date)
+    quantities = defaultdict(int)
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    occupancy = ProductOccupancy.objects.filter(day__gte=max(days[0], timezone.localdate()), day__lte=days[-1])
+    reopened = set(
+        occupancy.filter(product_id__in=quantities, reserved__gte=F('product__units'))
+        .values_list('product_id', flat=True).distinct()
+    )
+    for product_id, quantity in quantities.items():
+        ProductOccupancy.objects.filter(
+            product_id=product_id, day__gte=days[0], day__lte=days[-1],
+        ).update(reserved=F('reserved') - quantity)
+    if reopened:
+        # Days that were fully booked have free units again.
+        notifications.record_available(reopened, order.start_date, order.end_date)
+    transaction.on_commit(bump_version)
+
+
+def rebuild(since=None):
+    """Recompute the occupancy index from active orders ending on or after ``since``."""
+    since = since or timezone.localdate()
+    reserved = defaultdict(int)
+    items = (
+        OrderItem.objects
+        .filter(order__end_date__gte=since)
+        .exclude(order__status__in=RELEASED_STATUSES)
+        .values_list('product_id', 'quantity', 'order__start_date', 'order__end_date')
+        .iterator(chunk_size=5000)
+    )
+    for product_id, quantity, start_date, end_date in items:
+        for day in rental_days(start_date, end_date):
+            if day >= since:
+                reserved[(product_id, day)] += quantity
+
+    with transaction.atomic():
+        ProductOccupancy.objects.filter(day__gte=since).delete()
+        ProductOccupancy.objects.bulk_create(
+            [ProductOccupancy(product_id=p, day=d, reserved=r) for (p, d), r in reserved.items()],
+            batch_size=1000,
+        )
+        transaction.on_commit(bump_version)
+
+
+# --------------------------- Availability filter ---------------------------
+
+def get_version_store():
+    return FileVersionStore(getattr(settings, 'AVAILABILITY_VERSION_FILE', settings.BASE_DIR / '.availability_version'))
+
+
+def current_version():
+    return get_version_store().get()
+
+
+def bump_version():
+    return get_version_store().bump()
+
+
+class FullDaysMatrix:
+    """
+    Boolean matrix of fully booked days, one row per product that has at
+    least one full day in ``[base, base + horizon)``. Products with spare
+    capacity on every day have no row, so the matrix stays small.
+    """
+
+    def __init__(self, base, horizon, rows):
+        self.base = base
+        self.horizon = horizon
+        self.product_ids = np.array(sorted({product_id for product_id, _ in rows}), dtype=np.int64)
+        index = {product_id: i for i, product_id in enumerate(self.product_ids.tolist())}
+        self.full = np.zeros((len(self.product_ids), horizon), dtype=bool)
+        for product_id, day in rows:
+            self.full[index[product_id], (day - base).days] = True
+
+    def covers(self, start_date, end_date):
+        # The last rented day must have a column, or the slice is cut short.
+        last = (start_date - self.base).days + len(rental_days(start_date, end_date)) - 1
+        return start_date >= self.base and last < self.horizon
+
+    def blocked(self, start_date, end_date):
+        first = (start_date - self.base).days
+        last = first + len(rental_days(start_date, end_date))
+        return self.product_ids[self.full[:, first:last].any(axis=1)].tolist()
+
+
+_matrix = None
+_matrix_key = None
+
+
+def get_matrix():
+    global _matrix, _matrix_key
+    base = timezone.localdate()
+    key = (current_version(), base)
+    if _matrix_key != key:
+        horizon = getattr(settings, 'AVAILABILITY_HORIZON_DAYS', 365)
+        rows = list(
+            ProductOccupancy.objects
+            .filter(day__gte=base, day__lt=base + timedelta(days=horizon), reserved__gte=F('product__units'))
+            .values_list('product_id', 'day')
+        )
+        _matrix, _matrix_key = FullDaysMatrix(base, horizon, rows), key
+    return _matrix
+
+
+def filter_available(queryset, start_date, end_date):
+    """Restrict a Product queryset to products with a free unit on every day of the range."""
+    if np is not None:
+        matrix = get_matrix()
+        if matrix.covers(start_date, end_date):
+            return queryset.exclude(id__in=matrix.blocked(start_date, end_date))
+
+    days = rental_days(start_date, end_date)
+    full = ProductOccupancy.objects.filter(
+        day__gte=days[0], day__lte=days[-1], reserved__gte=F('product__units'),
+    ).values('product_id')
+    return queryset.exclude(id__in=full)
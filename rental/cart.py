@@ -0,0 +1,311 @@
+# type: ignore
+import json
+import uuid
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .models import Product, SavedCart
+
+
+SESSION_KEY = 'cart'
+CART_VERSION = 1
+COOKIE_NAME = 'cart'
+CART_ID_COOKIE = 'cart_id'
+COOKIE_SALT = 'rental.cart'
+# Browsers drop cookies over 4096 bytes, attributes included.
+COOKIE_MAX_BYTES = 3800
+
+
+class CartFull(Exception):
+    pass
+
+
+# --------------------------- Cart stores ---------------------------
+
+class SessionCartStore:
+    """Cart in the Django session (one django_session write per change)."""
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        return self.request.session.get(SESSION_KEY)
+
+    def save(self, data):
+        self.request.session[SESSION_KEY] = data
+
+    def forget(self):
+        pass  # logout flushes the session
+
+    def process_response(self, response):
+        return response
+
+
+class SignedCookieCartStore:
+    """
+    Cart in a signed cookie; no server-side state at all. Meant for small
+    carts: a change that would take the cookie past COOKIE_MAX_BYTES (about
+    200 lines) raises CartFull. The cookie is not tied to the session, so it
+    is deleted on logout.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.pending = None
+        self.forgotten = False
+
+    def load(self):
+        if self.pending is not None:
+            return self.pending
+        if self.forgotten:
+            return None
+        raw = self.request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    def save(self, data):
+        value = json.dumps(data, separators=(',', ':'))
+        signed = signing.get_cookie_signer(salt=COOKIE_NAME + COOKIE_SALT).sign(value)
+        if len(SimpleCookie().value_encode(signed)[1]) > COOKIE_MAX_BYTES:
+            raise CartFull("Your cart is full. Check out or remove some items first.")
+        self.pending = data
+
+    def forget(self):
+        self.pending = None
+        self.forgotten = True
+
+    def process_response(self, response):
+        if self.pending is not None:
+            response.set_signed_cookie(
+                COOKIE_NAME, json.dumps(self.pending, separators=(',', ':')),
+                salt=COOKIE_SALT,
+                max_age=settings.CART_TTL,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        elif self.forgotten:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
+
+
+class CacheCartStore:
+    """
+    Cart in the cache under an opaque cart id cookie, with write-behind to
+    SavedCart. Every change appends the cart id to a dirty log (an atomic
+    ``incr`` sequence); the ``flush_carts`` job drains the log and upserts
+    the carts in one statement. Needs a cache shared by the web processes
+    and the job worker (Redis/memcached); the system checks reject a
+    per-process cache.
+    """
+
+    seq_key = 'cart:dirty:seq'
+    flushed_key = 'cart:dirty:flushed'
+
+    def __init__(self, request):
+        self.request = request
+        self.cart_id = request.COOKIES.get(CART_ID_COOKIE)
+        self.new_id = False
+        self.forgotten = False
+        if not self.cart_id or len(self.cart_id) != 32:
+            self.cart_id = uuid.uuid4().hex
+            self.new_id = True
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def data_key(cart_id):
+        return f'cart:data:{cart_id}'
+
+    def load(self):
+        data = self.cache().get(self.data_key(self.cart_id))
+        if data is None and not self.new_id:
+            # Cache miss (eviction, restart): read the last flushed copy.
+            data = SavedCart.objects.filter(cart_id=self.cart_id).values_list('data', flat=True).first()
+            if data is not None:
+                self.cache().set(self.data_key(self.cart_id), data, settings.CART_TTL)
+        return data
+
+    def save(self, data):
+        cache = self.cache()
+        cache.set(self.data_key(self.cart_id), data, settings.CART_TTL)
+        cache.add(self.seq_key, 0, None)
+        seq = cache.incr(self.seq_key)
+        cache.set(f'cart:dirty:{seq}', self.cart_id, settings.CART_TTL)
+
+    def forget(self):
+        self.cart_id = uuid.uuid4().hex
+        self.new_id = True
+        self.forgotten = True
+
+    def process_response(self, response):
+        if self.new_id and self.request.__dict__.get('_cart_saved'):
+            response.set_cookie(
+                CART_ID_COOKIE, self.cart_id,
+                max_age=settings.CART_TTL,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        elif self.forgotten:
+            response.delete_cookie(CART_ID_COOKIE, samesite='Lax')
+        return response
+
+    @classmethod
+    def flush(cls):
+        """Write every cart changed since the last flush to SavedCart."""
+        cache = cls.cache()
+        start = cache.get(cls.flushed_key, 0)
+        head = cache.get(cls.seq_key, 0)
+        if head <= start:
+            return 0
+        log_keys = [f'cart:dirty:{i}' for i in range(start + 1, head + 1)]
+        cart_ids = set(cache.get_many(log_keys).values())
+        data = cache.get_many([cls.data_key(cart_id) for cart_id in cart_ids])
+        rows = [
+            SavedCart(cart_id=cart_id, data=data[cls.data_key(cart_id)])
+            for cart_id in cart_ids if cls.data_key(cart_id) in data
+        ]
+        SavedCart.objects.bulk_create(
+            rows, batch_size=500,
+            update_conflicts=True, unique_fields=['cart_id'], update_fields=['data', 'updated_at'],
+        )
+        cache.set(cls.flushed_key, head, None)
+        cache.delete_many(log_keys)
+        return len(rows)
+
+
+def get_cart_store(request):
+    """One store per request, so every Cart built during it shares pending writes."""
+    store = request.__dict__.get('_cart_store')
+    if store is None:
+        store_class = import_string(getattr(settings, 'CART_STORE', 'rental.cart.SessionCartStore'))
+        store = request._cart_store = store_class(request)
+    return store
+
+
+class CartLine:
+    def __init__(self, product, quantity, rental_days):
+        self.product = product
+        self.quantity = quantity
+        self.rental_days = rental_days
+        self.subtotal = product.price * quantity * rental_days
+
+    @property
+    def id(self):
+        return self.product.id
+
+    # checkout.html name for the line subtotal
+    @property
+    def total_price(self):
+        return self.subtotal
+
+
+class Cart:
+    """
+    Cart shared by the cart, checkout and order views, persisted through the
+    configured CART_STORE.
+
+    Stored as ``{"v": 1, "items": {"<product_id>": [quantity, rental_days]}}``.
+    Products are loaded with a single ``in_bulk`` query the first time lines
+    are needed; ids that no longer exist are dropped from the cart.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.store = get_cart_store(request)
+        self.items = self._load(self.store.load())
+        self._lines = None
+
+    @staticmethod
+    def _load(data):
+        if isinstance(data, dict) and data.get('v') == CART_VERSION:
+            return {str(k): [int(q), int(d)] for k, (q, d) in data.get('items', {}).items()}
+
+        # Legacy format: {"<id>": {"quantity": .., "rental_days": ..}} or {"<id>": quantity}
+        items = {}
+        for key, value in (data or {}).items():
+            try:
+                if isinstance(value, dict):
+                    items[str(key)] = [int(value.get('quantity', 1)), int(value.get('rental_days', 1))]
+                else:
+                    items[str(key)] = [int(value), 1]
+            except (TypeError, ValueError):
+                continue
+        return items
+
+    def save(self):
+        try:
+            self.store.save({'v': CART_VERSION, 'items': self.items})
+        except CartFull:
+            # Back to the last state the store accepted
+            self.items = self._load(self.store.load())
+            self._lines = None
+            raise
+        self.request._cart_saved = True
+        self._lines = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def add(self, product_id, quantity=1):
+        self.add_many([product_id], quantity)
+
+    def add_many(self, product_ids, quantity=1):
+        for product_id in product_ids:
+            key = str(product_id)
+            if key in self.items:
+                self.items[key][0] += quantity
+            else:
+                self.items[key] = [quantity, 1]
+        if product_ids:
+            self.save()
+
+    def update(self, product_id, quantity):
+        key = str(product_id)
+        if key not in self.items:
+            return
+        if quantity > 0:
+            self.items[key][0] = quantity
+        else:
+            del self.items[key]
+        self.save()
+
+    def remove(self, product_id):
+        if self.items.pop(str(product_id), None) is not None:
+            self.save()
+
+    def clear(self):
+        self.items = {}
+        self.save()
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            ids = [int(key) for key in self.items if key.isdigit()]
+            products = Product.objects.in_bulk(ids)
+            stale = [key for key in self.items if not key.isdigit() or int(key) not in products]
+            if stale:
+                for key in stale:
+                    del self.items[key]
+                self.save()
+            self._lines = [
+                CartLine(products[int(key)], max(quantity, 1), max(rental_days, 1))
+                for key, (quantity, rental_days) in self.items.items()
+            ]
+        return self._lines
+
+    @property
+    def total(self):
+        return sum((line.subtotal for line in self.lines), 0)
@@ -0,0 +1,96 @@
+# type: ignore
+import os
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Category, Brand
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+CACHE_PREFIX = 'catalog'
+
+
+class FileVersionStore:
+    """
+    Catalog version counter kept in a small file so that every worker
+    process sees a bump on its next read. Stands in for a shared store
+    such as Redis; reads are a single small file read, no DB query.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def get(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def bump(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a+') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                version = int(f.read().strip() or 0) + 1
+            except ValueError:
+                version = 1
+            f.seek(0)
+            f.truncate()
+            f.write(str(version))
+            f.flush()
+            # lock is released when the file is closed
+        return version
+
+
+def get_version_store():
+    return FileVersionStore(getattr(settings, 'CATALOG_VERSION_FILE', settings.BASE_DIR / '.catalog_version'))
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def current_version():
+    return get_version_store().get()
+
+
+def bump_version():
+    return get_version_store().bump()
+
+
+def cached(key, loader, version=None, timeout=None):
+    """Return ``loader()`` cached under ``key`` for the current catalog version."""
+    if version is None:
+        version = current_version()
+    cache = get_cache()
+    key = f'{CACHE_PREFIX}:{key}'
+    value = cache.get(key, version=version)
+    if value is None:
+        value = loader()
+        cache.set(key, value, timeout=timeout, version=version)
+    return value
+
+
+def params_key(prefix, params):
+    """Stable cache key for a set of query params."""
+    encoded = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return f'{prefix}:{hashlib.md5(encoded.encode()).hexdigest()}'
+
+
+# --------------------------- Catalog data ---------------------------
+
+def get_categories(version=None):
+    return cached('categories', lambda: list(Category.objects.all()), version)
+
+
+def get_brands(version=None):
+    return cached('brands', lambda: list(Brand.objects.all()), version)
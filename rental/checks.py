@@ -0,0 +1,25 @@
+# type: ignore
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+
+@checks.register()
+def check_cart_store(app_configs, **kwargs):
+    from .cart import CacheCartStore
+
+    store = getattr(settings, 'CART_STORE', 'rental.cart.SessionCartStore')
+    if not issubclass(import_string(store), CacheCartStore):
+        return []
+    alias = getattr(settings, 'CART_CACHE_ALIAS', 'default')
+    if isinstance(caches[alias], (LocMemCache, DummyCache)):
+        return [checks.Error(
+            f"CacheCartStore needs a cache shared by all processes; '{alias}' is per-process.",
+            hint="Point CART_CACHE_ALIAS at a Redis or memcached cache, or use another CART_STORE.",
+            obj=store,
+            id='rental.E001',
+        )]
+    return []
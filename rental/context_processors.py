@@ -0,0 +1,15 @@
+# type: ignore
+from django.utils.functional import SimpleLazyObject
+
+from .roles import get_roles
+from .wishlist import wishlist_ids
+
+
+def wishlist(request):
+    """``wishlist_ids`` for templates; only looked up if a template uses it."""
+    return {'wishlist_ids': SimpleLazyObject(lambda: wishlist_ids(request.user))}
+
+
+def roles(request):
+    """``roles`` (groups and profile_type) from the session role cache."""
+    return {'roles': SimpleLazyObject(lambda: get_roles(request))}
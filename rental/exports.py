@@ -0,0 +1,129 @@
+# type: ignore
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.text import compress_sequence
+
+from .models import ArchivedOrder, CorporateProfile, IndividualProfile, OrderItem, Product, StudioProfile
+
+
+CHUNK_SIZE = 2000
+# Rows are written out in blocks of about this many bytes.
+BUFFER_SIZE = 64 * 1024
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+PROFILE_FIELDS = (
+    'id', 'user_id', 'user__username', 'user__email', 'mobile_phone', 'whatsapp_number',
+    'governorate', 'city', 'hear_about', 'created_at',
+)
+
+# name -> (model, columns, date field used by start/end)
+EXPORTS = {
+    'orders': (OrderItem, (
+        'order_id', 'order__created_at', 'order__user_id', 'order__user__username', 'order__status',
+        'order__start_date', 'order__end_date', 'order__is_delivery', 'order__city', 'order__total_price',
+        'id', 'product_id', 'product__name', 'quantity', 'price',
+    ), 'order__created_at'),
+    'products': (Product, (
+        'id', 'name', 'category_id', 'category__name', 'brand_id', 'brand__name', 'price', 'units', 'image',
+    ), None),
+    'individual_profiles': (IndividualProfile, PROFILE_FIELDS + (
+        'full_name', 'date_of_birth', 'professional_category', 'camera_system', 'portfolio_link',
+    ), 'created_at'),
+    'corporate_profiles': (CorporateProfile, PROFILE_FIELDS + (
+        'company_name', 'company_website', 'ceo_name', 'ceo_email', 'authorized_name', 'authorized_email',
+    ), 'created_at'),
+    'studio_profiles': (StudioProfile, (
+        'id', 'user_id', 'user__username', 'user__email', 'studio_name', 'phone', 'whatsapp', 'email', 'created_at',
+    ), 'created_at'),
+}
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _between(queryset, date_field, start=None, end=None):
+    if start:
+        queryset = queryset.filter(**{f'{date_field}__gte': timezone.make_aware(datetime.combine(start, time.min))})
+    if end:
+        queryset = queryset.filter(
+            **{f'{date_field}__lt': timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))}
+        )
+    return queryset
+
+
+def archived_order_rows(start=None, end=None):
+    """``orders`` rows for the lines of archived orders; those lines have no OrderItem id."""
+    orders = _between(ArchivedOrder.objects.order_by('pk'), 'created_at', start, end).values_list(
+        'id', 'created_at', 'user_id', 'user__username', 'status', 'start_date', 'end_date', 'is_delivery',
+        'city', 'total_price', 'items',
+    )
+    for *order, items in orders.iterator(chunk_size=CHUNK_SIZE):
+        for line in items:
+            yield (*order, None, line['product_id'], line['product_name'], line['quantity'], Decimal(line['price']))
+
+
+# Rows appended to an export from outside its model
+EXTRA_ROWS = {'orders': archived_order_rows}
+
+
+def export_rows(name, start=None, end=None):
+    """
+    The header and a row iterator for export ``name``. Rows are plain
+    tuples read with a chunked server-side iterator, so memory does not grow
+    with the size of the table. ``start``/``end`` are inclusive dates.
+    The orders export includes archived orders after the live ones.
+    """
+    model, columns, date_field = EXPORTS[name]
+    queryset = model.objects.order_by('pk')
+    if date_field:
+        queryset = _between(queryset, date_field, start, end)
+    rows = queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+    if name in EXTRA_ROWS:
+        rows = chain(rows, EXTRA_ROWS[name](start, end))
+    return columns, rows
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def stream_export(name, fmt='csv', start=None, end=None, gzip=False):
+    """Iterate the encoded (and optionally gzipped) bytes of an export."""
+    columns, rows = export_rows(name, start, end)
+    lines = _csv_lines(columns, rows) if fmt == 'csv' else _jsonl_lines(columns, rows)
+    chunks = _buffered(lines)
+    return compress_sequence(chunks) if gzip else chunks
+
+
+def export_filename(name, fmt, gzip=False):
+    return f"{name}-{timezone.localdate().isoformat()}.{fmt}{'.gz' if gzip else ''}"
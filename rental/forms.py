@@ -3,6 +3,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import IndividualProfile, CorporateProfile, StudioProfile
+from .jobs import enqueue
+from .uploads import queue_downscale, store_upload
 
 class BaseRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
@@ -50,11 +52,11 @@ class IndividualRegistrationForm(BaseRegistrationForm):
 
     def save(self, commit=True):
         user = super().save(commit)
-        IndividualProfile.objects.create(
+        profile = IndividualProfile.objects.create(
             user=user,
             full_name=self.cleaned_data['full_name'],
-            phone=self.cleaned_data['phone'],
-            whatsapp=self.cleaned_data['whatsapp'],
+            mobile_phone=self.cleaned_data['phone'],
+            whatsapp_number=self.cleaned_data['whatsapp'],
             date_of_birth=self.cleaned_data['date_of_birth'],
             profile_link=self.cleaned_data['profile_link'],
             camera_system=self.cleaned_data['camera_system'],
@@ -67,10 +69,13 @@ class IndividualRegistrationForm(BaseRegistrationForm):
             apartment=self.cleaned_data['apartment'],
             professional_category=self.cleaned_data['professional_category'],
             portfolio_link=self.cleaned_data['portfolio_link'],
-            id_front=self.cleaned_data['id_front'],
-            id_rear=self.cleaned_data['id_rear'],
-            other_id=self.cleaned_data['other_id']
+            id_front=store_upload(self.cleaned_data['id_front'], 'ids/individual/'),
+            id_rear=store_upload(self.cleaned_data['id_rear'], 'ids/individual/'),
+            other_id=store_upload(self.cleaned_data['other_id'], 'ids/individual/'),
+            agreed_to_terms=self.cleaned_data['agree_terms'],
         )
+        queue_downscale(profile, 'id_front', 'id_rear', 'other_id')
+        enqueue('user_registered', user_id=user.id, account_type='individual')
         return user
 
 class CorporateRegistrationForm(BaseRegistrationForm):
@@ -95,26 +100,32 @@ class CorporateRegistrationForm(BaseRegistrationForm):
 
     def save(self, commit=True):
         user = super().save(commit)
-        CorporateProfile.objects.create(
+        profile = CorporateProfile.objects.create(
             user=user,
             company_name=self.cleaned_data['company_name'],
             company_address=self.cleaned_data['company_address'],
-            company_phone=self.cleaned_data['company_phone'],
+            mobile_phone=self.cleaned_data['company_phone'],
             company_website=self.cleaned_data['company_website'],
             company_social=self.cleaned_data['company_social'],
             ceo_name=self.cleaned_data['ceo_name'],
             ceo_phone=self.cleaned_data['ceo_phone'],
             ceo_email=self.cleaned_data['ceo_email'],
-            ceo_id_front=self.cleaned_data['ceo_id_front'],
-            ceo_id_rear=self.cleaned_data['ceo_id_rear'],
-            auth_name=self.cleaned_data['auth_name'],
-            auth_phone=self.cleaned_data['auth_phone'],
-            auth_email=self.cleaned_data['auth_email'],
-            auth_id_front=self.cleaned_data['auth_id_front'],
-            auth_id_rear=self.cleaned_data['auth_id_rear'],
-            tax_card=self.cleaned_data['tax_card'],
-            commercial_reg=self.cleaned_data['commercial_reg']
+            ceo_id_front=store_upload(self.cleaned_data['ceo_id_front'], 'ids/corporate/'),
+            ceo_id_rear=store_upload(self.cleaned_data['ceo_id_rear'], 'ids/corporate/'),
+            authorized_name=self.cleaned_data['auth_name'],
+            authorized_phone=self.cleaned_data['auth_phone'],
+            authorized_email=self.cleaned_data['auth_email'],
+            authorized_id_front=store_upload(self.cleaned_data['auth_id_front'], 'ids/corporate/'),
+            authorized_id_rear=store_upload(self.cleaned_data['auth_id_rear'], 'ids/corporate/'),
+            tax_certificate=store_upload(self.cleaned_data['tax_card'], 'docs/corporate/'),
+            commercial_registration=store_upload(self.cleaned_data['commercial_reg'], 'docs/corporate/'),
+            agreed_to_terms=self.cleaned_data['agree_terms'],
+        )
+        queue_downscale(
+            profile, 'ceo_id_front', 'ceo_id_rear', 'authorized_id_front', 'authorized_id_rear',
+            'tax_certificate', 'commercial_registration',
         )
+        enqueue('user_registered', user_id=user.id, account_type='corporate')
         return user
 
 class StudioRegistrationForm(BaseRegistrationForm):
@@ -140,16 +151,18 @@ class StudioRegistrationForm(BaseRegistrationForm):
 
     def save(self, commit=True):
         user = super().save(commit)
-        StudioProfile.objects.create(
+        profile = StudioProfile.objects.create(
             user=user,
             studio_name=self.cleaned_data['studio_name'],
             phone=self.cleaned_data['phone'],
             whatsapp=self.cleaned_data['whatsapp'],
             email=self.cleaned_data['email'],
-            id_front=self.cleaned_data['id_front'],
-            id_rear=self.cleaned_data['id_rear'],
+            id_front=store_upload(self.cleaned_data['id_front'], 'ids/studio/'),
+            id_rear=store_upload(self.cleaned_data['id_rear'], 'ids/studio/'),
             profile_link=self.cleaned_data['profile_link'],
             hear_about=self.cleaned_data['hear_about'],
             governorate=self.cleaned_data['governorate']
         )
+        queue_downscale(profile, 'id_front', 'id_rear')
+        enqueue('user_registered', user_id=user.id, account_type='studio')
         return user
@@ -0,0 +1,159 @@
+# type: ignore
+import base64
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import catalog_cache
+from .models import Product, ProductImageDerivative
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+
+DERIVATIVE_DIR = 'products/derivatives'
+# Pillow save options per format, best first; formats Pillow cannot encode are skipped.
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 55}),
+    'webp': ('WEBP', 'image/webp', {'quality': 78, 'method': 6}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+PLACEHOLDER_SIZE = 16
+
+
+def widths():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (160, 320, 480, 640)))
+
+
+def available_formats():
+    if Image is None:
+        return []
+    return [fmt for fmt in FORMATS if fmt == 'jpeg' or features.check(fmt)]
+
+
+def target_widths(original_width):
+    """Configured widths below the original, plus the original (capped) size."""
+    sizes = [w for w in widths() if w < original_width]
+    sizes.append(min(original_width, max(widths())))
+    return sorted(set(sizes))
+
+
+def placeholder(image):
+    """A ~16px blurred WebP of ``image`` as a data URI (a few hundred bytes)."""
+    tiny = image.convert('RGB')
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    tiny.save(buffer, format='WEBP' if features.check('webp') else 'JPEG', quality=30)
+    mime = 'image/webp' if features.check('webp') else 'image/jpeg'
+    return f'data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode()}'
+
+
+def render(source):
+    """
+    Encode every derivative of the stored image ``source``. Only reads the
+    source: nothing is written to the storage or the database, so it can
+    run in a worker process. Returns ``(rows, info)`` for
+    ``save_derivatives``: the derivative rows, each with its encoded
+    ``content``, and the Product image dimensions and placeholder.
+    """
+    with default_storage.open(source) as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    info = {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_placeholder': placeholder(image),
+    }
+    rows = []
+    for width in target_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for fmt in available_formats():
+            pil_format, _, options = FORMATS[fmt]
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode == 'RGBA':
+                # Flatten transparency onto white
+                background = Image.new('RGB', frame.size, (255, 255, 255))
+                background.paste(frame, mask=frame.getchannel('A'))
+                frame = background
+            buffer = io.BytesIO()
+            frame.save(buffer, format=pil_format, **options)
+            rows.append({
+                'format': fmt, 'width': width, 'height': height, 'content': buffer.getvalue(),
+            })
+    return rows, info
+
+
+def save_derivatives(product_id, source, rows, info):
+    """
+    Write the rendered files, then replace the product's derivative rows and
+    store its image dimensions and placeholder, provided the product still
+    has the image ``source``. Returns False if it has moved on. Files are
+    shared by content and never deleted here; ``collect_media`` removes the
+    ones no row names any more.
+    """
+    derivatives = []
+    for row in rows:
+        row = dict(row)
+        content = row.pop('content')
+        # The storage names the file <DERIVATIVE_DIR>/<aa>/<sha256>.<fmt>
+        row['file'] = default_storage.save(f"{DERIVATIVE_DIR}/derivative.{row['format']}", ContentFile(content))
+        row['size'] = len(content)
+        derivatives.append(ProductImageDerivative(product_id=product_id, source=source, **row))
+
+    with transaction.atomic():
+        # A render of an older image that finishes late must not replace the current one.
+        if not Product.objects.select_for_update().filter(pk=product_id, image=source).exists():
+            return False
+        # update() skips the Product signals; only cached pages need to know.
+        Product.objects.filter(pk=product_id).update(**info)
+        transaction.on_commit(catalog_cache.bump_version)
+        ProductImageDerivative.objects.filter(product_id=product_id).delete()
+        ProductImageDerivative.objects.bulk_create(derivatives)
+    return True
+
+
+def build_derivatives(product_id):
+    """Render and record the derivatives of one product's current image."""
+    if Image is None:
+        return False
+    source = Product.objects.filter(pk=product_id).values_list('image', flat=True).first()
+    if not source:
+        return False
+    try:
+        rows, info = render(source)
+    except (FileNotFoundError, OSError):
+        return False
+    return save_derivatives(product_id, source, rows, info)
+
+
+def picture_sources(derivatives):
+    """
+    ``(fallback, sources)`` for a <picture>: ``sources`` is a list of
+    ``(mime type, srcset)`` best format first; ``fallback`` is the
+    ``(src, srcset, width, height)`` of the JPEG set.
+    """
+    by_format = {}
+    for derivative in derivatives:
+        by_format.setdefault(derivative.format, []).append(derivative)
+    sources = []
+    for fmt in FORMATS:
+        if fmt in by_format and fmt != 'jpeg':
+            items = sorted(by_format[fmt], key=lambda d: d.width)
+            sources.append((FORMATS[fmt][1], ', '.join(f'{d.url} {d.width}w' for d in items)))
+    fallback = None
+    if 'jpeg' in by_format:
+        items = sorted(by_format['jpeg'], key=lambda d: d.width)
+        largest = items[-1]
+        fallback = (largest.url, ', '.join(f'{d.url} {d.width}w' for d in items), largest.width, largest.height)
+    return fallback, sources
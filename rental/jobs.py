@@ -0,0 +1,186 @@
+# type: ignore
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_periodic = {}
+_timeouts = {}
+
+# A job still "running" after this long is assumed to belong to a dead worker,
+# unless its task was registered with a longer ``timeout``.
+LOCK_TIMEOUT = timedelta(minutes=10)
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+
+def task(name, every=None, timeout=None):
+    """
+    Register a function as the handler for jobs called ``name``. With
+    ``every`` (a timedelta) the job is periodic: the worker keeps exactly one
+    instance queued and re-enqueues it after each run. ``timeout`` replaces
+    LOCK_TIMEOUT for tasks that legitimately run longer.
+    """
+    def decorator(func):
+        _registry[name] = func
+        if every:
+            _periodic[name] = every
+        if timeout:
+            _timeouts[name] = timeout
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=5, delay=None, **payload):
+    """
+    Add a job to the outbox. Called inside a transaction, the job is
+    committed (or rolled back) together with the data it refers to.
+    """
+    run_after = timezone.now() + delay if delay else timezone.now()
+    return Job.objects.create(name=name, payload=payload, max_attempts=max_attempts, run_after=run_after)
+
+
+def enqueue_many(name, payloads, max_attempts=5):
+    """Add one job per payload with a single INSERT."""
+    now = timezone.now()
+    return Job.objects.bulk_create(
+        [Job(name=name, payload=payload, max_attempts=max_attempts, run_after=now) for payload in payloads],
+        batch_size=500,
+    )
+
+
+def periodic_slot(every, at):
+    """Start of the ``every``-long slot containing ``at``, aligned to the epoch."""
+    seconds = every.total_seconds()
+    return datetime.fromtimestamp(at.timestamp() // seconds * seconds, tz=dt_timezone.utc)
+
+
+def enqueue_periodic(name, run_after, payload=None):
+    """
+    Queue a periodic run at a slot boundary. (name, run_after) is unique for
+    periodic jobs, so workers scheduling the same slot at once add one row.
+    """
+    Job.objects.bulk_create(
+        [Job(name=name, payload=payload or {}, run_after=run_after, periodic=True)],
+        ignore_conflicts=True,
+    )
+
+
+def backoff(attempts):
+    """Exponential backoff with jitter: 30s, 60s, 120s, ... capped at 6h."""
+    seconds = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+
+def reclaim_stale(now=None):
+    """
+    Take back jobs whose worker held them past their timeout. The lost run
+    counts as an attempt, so a job that never finishes in time ends up failed
+    instead of being retried forever.
+    """
+    now = now or timezone.now()
+    stale = Q(locked_at__lt=now - LOCK_TIMEOUT) & ~Q(name__in=list(_timeouts))
+    for name, timeout in _timeouts.items():
+        stale |= Q(name=name, locked_at__lt=now - timeout)
+    running = Job.objects.filter(stale, status=Job.RUNNING)
+    released = {'attempts': F('attempts') + 1, 'locked_by': '', 'locked_at': None, 'last_error': "Worker lock timed out"}
+    failed = running.filter(attempts__gte=F('max_attempts') - 1).update(status=Job.FAILED, finished_at=now, **released)
+    retried = running.update(status=Job.PENDING, run_after=now, **released)
+    return failed + retried
+
+
+def claim(batch_size, worker):
+    """Atomically take up to ``batch_size`` due jobs for ``worker``."""
+    now = timezone.now()
+    reclaim_stale(now)
+
+    with transaction.atomic():
+        ids = list(
+            Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        # Only rows still pending are taken, so two workers never share a job.
+        Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now,
+        )
+    return list(Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker))
+
+
+def run_job(job):
+    handler = _registry.get(job.name)
+    job.attempts += 1
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job '{job.name}'")
+        handler(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s failed permanently", job)
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s failed, retrying at %s", job, job.run_after)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.last_error = ''
+    # Only the worker still holding the lock may record the outcome; a job
+    # reclaimed after its timeout belongs to whoever claimed it next.
+    saved = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, locked_at=job.locked_at,
+    ).update(
+        status=job.status, attempts=job.attempts, run_after=job.run_after, last_error=job.last_error,
+        finished_at=job.finished_at, locked_by='', locked_at=None,
+    )
+    job.locked_by = ''
+    job.locked_at = None
+    if not saved:
+        logger.warning("Job %s outlived its lock; its result was dropped", job)
+        return False
+    if job.name in _periodic and job.status != Job.PENDING:
+        every = _periodic[job.name]
+        enqueue_periodic(job.name, periodic_slot(every, timezone.now()) + every, job.payload)
+    return job.status == Job.DONE
+
+
+def schedule_periodic():
+    """Queue every periodic job that is not already waiting or running."""
+    now = timezone.now()
+    queued = set(
+        Job.objects.filter(name__in=_periodic, status__in=[Job.PENDING, Job.RUNNING])
+        .values_list('name', flat=True)
+    )
+    for name, every in _periodic.items():
+        if name in queued:
+            continue
+        slot = periodic_slot(every, now)
+        if Job.objects.filter(name=name, run_after=slot, periodic=True).exists():
+            slot += every  # this slot already ran
+        enqueue_periodic(name, slot)
+
+
+def process_batch(batch_size=50, worker=None):
+    """Run one batch of due jobs; returns the number of jobs claimed."""
+    jobs = claim(batch_size, worker or worker_id())
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
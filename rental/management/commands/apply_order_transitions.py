@@ -0,0 +1,15 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental.orders import mark_overdue
+
+
+class Command(BaseCommand):
+    help = "Apply time-based order status changes (Out past end_date -> Overdue). Run from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = mark_overdue(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} order(s) marked Overdue."))
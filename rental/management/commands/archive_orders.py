@@ -0,0 +1,16 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move orders closed more than N months ago into ArchivedOrder."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help="Defaults to settings.ORDER_ARCHIVE_MONTHS.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        moved = archive_orders(options['months'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{moved} order(s) archived."))
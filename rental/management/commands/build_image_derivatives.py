@@ -0,0 +1,47 @@
+# type: ignore
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
+
+from rental.images import render, save_derivatives
+from rental.models import Product, ProductImageDerivative
+
+
+def _render(product_id, source):
+    try:
+        return product_id, source, *render(source), None
+    except (FileNotFoundError, OSError) as e:
+        return product_id, source, None, None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Build responsive image derivatives and placeholders for the catalog in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Encoder processes.")
+        parser.add_argument('--all', action='store_true', help="Rebuild products that already have derivatives.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            # Skip products whose derivatives and placeholder match their current image
+            products = products.filter(Q(image_placeholder='') | ~Exists(
+                ProductImageDerivative.objects.filter(product=OuterRef('pk'), source=OuterRef('image'))
+            ))
+        work = list(products.values_list('id', 'image'))
+        # Encoding happens in the workers; only this process writes files and rows.
+        connections.close_all()
+        built = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(_render, product_id, source) for product_id, source in work]
+            for future in as_completed(futures):
+                product_id, source, rows, info, error = future.result()
+                if error:
+                    self.stderr.write(f"Product {product_id}: {error}")
+                    continue
+                if save_derivatives(product_id, source, rows, info):
+                    built += 1
+        self.stdout.write(self.style.SUCCESS(f"Derivatives built for {built} of {len(work)} product(s)."))
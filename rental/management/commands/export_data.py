@@ -0,0 +1,33 @@
+# type: ignore
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from rental.exports import EXPORTS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream an export (orders, products or profiles) as CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output.")
+        parser.add_argument('--output', '-o', help="File to write to. Defaults to stdout.")
+
+    def handle(self, *args, **options):
+        chunks = stream_export(
+            options['name'], options['format'], options['start'], options['end'], options['gzip'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
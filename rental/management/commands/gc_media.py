@@ -0,0 +1,26 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental import storage
+
+
+class Command(BaseCommand):
+    help = "Recount media references and delete files nothing points at."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--adopt', action='store_true',
+            help="First move files that predate the content-addressed storage into it.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be deleted.")
+
+    def handle(self, *args, **options):
+        if options['adopt']:
+            moved = storage.adopt(dry_run=options['dry_run'])
+            verb = "would be moved" if options['dry_run'] else "moved"
+            self.stdout.write(f"{moved} file(s) {verb} to content-addressed names.")
+        names = storage.collect(dry_run=options['dry_run'])
+        for name in names:
+            self.stdout.write(name)
+        verb = "would be deleted" if options['dry_run'] else "deleted"
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} orphaned file(s) {verb}."))
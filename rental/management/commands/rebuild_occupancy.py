@@ -0,0 +1,20 @@
+# type: ignore
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from rental.availability import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product availability index from active orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help="First day to rebuild (YYYY-MM-DD). Defaults to today.",
+        )
+
+    def handle(self, *args, **options):
+        rebuild(options['since'])
+        self.stdout.write(self.style.SUCCESS("Availability index rebuilt."))
@@ -0,0 +1,14 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental.models import Product
+from rental.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from the Product table."
+
+    def handle(self, *args, **options):
+        products = Product.objects.only('id', 'name', 'description').iterator(chunk_size=2000)
+        get_backend().rebuild(products)
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
@@ -0,0 +1,25 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental.models import ProductPopularity
+from rental.popularity import rebuild_daily, refresh_windows
+
+
+class Command(BaseCommand):
+    help = "Refresh the best-seller ranking windows. The job worker also does this daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Recompute the daily buckets from all orders, archived ones included, first.",
+        )
+        parser.add_argument(
+            '--window', action='append', choices=list(ProductPopularity.WINDOW_DAYS),
+            help="Only refresh this window (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild_daily()
+        refresh_windows(options['window'])
+        self.stdout.write(self.style.SUCCESS("Popularity ranking refreshed."))
@@ -0,0 +1,21 @@
+# type: ignore
+from django.core.management.base import BaseCommand
+
+from rental import analytics
+
+
+class Command(BaseCommand):
+    help = "Fold new orders into the analytics rollups (RentalFact)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true', help="Recompute all facts from scratch, archived orders included.",
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = analytics.rebuild(options['batch_size'])
+        else:
+            count = analytics.rollup_new_orders(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} order(s) rolled up."))
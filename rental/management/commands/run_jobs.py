@@ -0,0 +1,27 @@
+# type: ignore
+import time
+
+from django.core.management.base import BaseCommand
+
+from rental.jobs import process_batch, schedule_periodic, worker_id
+
+
+class Command(BaseCommand):
+    help = "Drain the background job outbox (order emails, notifications, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Process one batch and exit.")
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        schedule_periodic()
+        self.stdout.write(f"Job worker {worker} started.")
+        while True:
+            count = process_batch(options['batch_size'], worker)
+            if options['once']:
+                self.stdout.write(f"Processed {count} job(s).")
+                return
+            if not count:
+                time.sleep(options['sleep'])
@@ -0,0 +1,246 @@
+# type: ignore
+import gzip
+import hashlib
+import io
+import logging
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CartMiddleware:
+    """Lets cookie-based cart stores attach their cookies to the response."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        store = request.__dict__.get('_cart_store')
+        if store is not None:
+            response = store.process_response(response)
+        return response
+
+
+# --------------------------- Response compression ---------------------------
+
+# Bodies shorter than this are not worth the CPU or the extra header bytes
+COMPRESS_MIN_SIZE = 200
+# Larger bodies are compressed but never kept in the cache
+COMPRESS_CACHE_MAX_SIZE = 512 * 1024
+COMPRESS_CACHE_TIMEOUT = 60 * 60
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml',
+    'application/x-ndjson', 'image/svg+xml',
+)
+# (level per request, level when the result is cached and reused)
+GZIP_LEVELS = (6, 9)
+BROTLI_QUALITIES = (5, 9)
+# Up to this many random bytes go into the gzip header of pages that may
+# hold secrets, so their length cannot be used to guess them (BREACH).
+GZIP_MAX_RANDOM_BYTES = 100
+
+compression_logger = logging.getLogger('rental.compression')
+
+
+def accepted_encodings(header):
+    """Codings from an Accept-Encoding header that the client allows (q > 0)."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().lower().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                continue
+        if coding and q > 0:
+            accepted.add(coding.strip())
+    return accepted
+
+
+def negotiate(header, padded=False):
+    """The coding to use; ``padded`` responses need gzip, which has room for the padding."""
+    accepted = accepted_encodings(header)
+    if brotli is not None and not padded and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def gzip_file(fileobj, level, padded=False):
+    # A random-length file name is the padding; clients ignore it.
+    filename = b'a' * secrets.randbelow(GZIP_MAX_RANDOM_BYTES + 1) if padded else b''
+    return gzip.GzipFile(filename=filename, mode='wb', compresslevel=level, fileobj=fileobj, mtime=0)
+
+
+def compress(data, encoding, cached=False, padded=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITIES[cached])
+    buffer = io.BytesIO()
+    with gzip_file(buffer, GZIP_LEVELS[cached], padded) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def compress_stream(chunks, encoding, stats, padded=False):
+    """
+    Compress an iterable of bytes, flushing after every chunk so it still
+    streams. Sizes and compression CPU seconds are added to ``stats``.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITIES[0])
+
+        def step(chunk):
+            return compressor.process(chunk) + compressor.flush()
+        finish = compressor.finish
+    else:
+        buffer = io.BytesIO()
+        compressor = gzip_file(buffer, GZIP_LEVELS[0], padded)
+
+        def drain():
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+
+        def step(chunk):
+            compressor.write(chunk)
+            compressor.flush()
+            return drain()
+
+        def finish():
+            compressor.close()
+            return drain()
+
+    for chunk in chunks:
+        started = time.thread_time()
+        data = step(chunk)
+        stats['cpu'] += time.thread_time() - started
+        stats['size'] += len(chunk)
+        stats['compressed'] += len(data)
+        if data:
+            yield data
+    data = finish()
+    stats['compressed'] += len(data)
+    yield data
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when the ``brotli`` package is installed) or gzip, whichever the
+    client prefers. Tiny bodies, binary types and responses that already
+    carry a Content-Encoding are left alone; streaming responses are
+    compressed chunk by chunk.
+
+    Pages rendered for anonymous visitors without a CSRF token are the same
+    bytes for everyone, so their compressed form is cached under a hash of
+    the body and hot pages are compressed once per change, at a higher level.
+    Every other page may hold secrets, so it is gzipped with random padding
+    in the header (as Django's GZipMiddleware does) against BREACH.
+
+    Every compressed response is logged to ``rental.compression`` with its
+    sizes and CPU time, and non-streaming ones get a Server-Timing entry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        padded = self.may_hold_secrets(request)
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), padded)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = self.measure_stream(
+                request, response.streaming_content, encoding, padded,
+            )
+            del response.headers['Content-Length']
+        else:
+            started = time.thread_time()
+            content = response.content
+            if not padded and self.cacheable(request, response):
+                compressed = self.cached_compress(content, encoding)
+            else:
+                compressed = compress(content, encoding, padded=padded)
+            cpu_ms = (time.thread_time() - started) * 1000
+            self.record(request, encoding, len(content), len(compressed), cpu_ms)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+            response.headers['Server-Timing'] = (
+                f'compress;dur={cpu_ms:.2f};desc="{encoding} {len(compressed) / len(content):.2f}"'
+            )
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def should_compress(response):
+        if response.has_header('Content-Encoding'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= COMPRESS_MIN_SIZE
+
+    @staticmethod
+    def may_hold_secrets(request):
+        """True for pages with a CSRF token or rendered for a signed-in user."""
+        if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated
+
+    @classmethod
+    def cacheable(cls, request, response):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return False
+        if len(response.content) > COMPRESS_CACHE_MAX_SIZE or response.cookies:
+            return False
+        # A page with a CSRF token differs on every request.
+        return not cls.may_hold_secrets(request)
+
+    @staticmethod
+    def cached_compress(content, encoding):
+        cache = caches[getattr(settings, 'COMPRESSION_CACHE_ALIAS', 'default')]
+        key = f'compressed:{encoding}:{hashlib.blake2b(content, digest_size=20).hexdigest()}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(content, encoding, cached=True)
+            cache.set(key, compressed, COMPRESS_CACHE_TIMEOUT)
+        return compressed
+
+    def measure_stream(self, request, chunks, encoding, padded=False):
+        stats = {'size': 0, 'compressed': 0, 'cpu': 0.0}
+        yield from compress_stream(chunks, encoding, stats, padded)
+        self.record(request, encoding, stats['size'], stats['compressed'], stats['cpu'] * 1000)
+
+    @staticmethod
+    def record(request, encoding, size, compressed_size, cpu_ms):
+        compression_logger.debug(
+            "%s %s: %s %d -> %d bytes (ratio %.2f) in %.2f ms CPU",
+            request.method, request.path, encoding, size, compressed_size,
+            compressed_size / size if size else 1.0, cpu_ms,
+        )
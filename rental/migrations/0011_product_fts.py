@@ -0,0 +1,56 @@
+import unicodedata
+
+from django.db import migrations
+
+# Frozen copies of rental.search at the time of this migration, so later
+# changes to the search module cannot alter the schema history.
+CREATE_FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS rental_product_fts USING fts5("
+    "name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+INSERT_FTS_ROW = "INSERT INTO rental_product_fts (rowid, name, description) VALUES (%s, %s, %s)"
+DROP_FTS_TABLE = "DROP TABLE IF EXISTS rental_product_fts"
+
+ARABIC_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,
+})
+ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+
+
+def normalize(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.translate(ARABIC_FOLD).translate(ARABIC_DIGITS).casefold()
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('rental', 'Product')
+    schema_editor.execute(CREATE_FTS_TABLE)
+    for product in Product.objects.only('id', 'name', 'description').iterator():
+        schema_editor.execute(
+            INSERT_FTS_ROW,
+            [product.pk, normalize(product.name), normalize(product.description)],
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_FTS_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0010_rename_mobile_phone_studioprofile_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0012_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('7d', 'Last 7 days'), ('30d', 'Last 30 days'), ('all', 'All time')], max_length=3)),
+                ('rentals', models.PositiveIntegerField(default=0)),
+                ('rental_days', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rental.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='rental.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', '-rentals', '-rental_days'], name='popularity_rank_idx'), models.Index(fields=['window', 'category', '-rentals', '-rental_days'], name='popularity_cat_rank_idx')],
+                'unique_together': {('product', 'window')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRentalDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('rentals', models.PositiveIntegerField(default=0)),
+                ('rental_days', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rentals', to='rental.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='rental_prod_day_cb12e5_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
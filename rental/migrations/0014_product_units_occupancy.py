@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:23
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_occupancy(apps, schema_editor):
+    # Existing bookings must block the units they hold from the first deploy.
+    OrderItem = apps.get_model('rental', 'OrderItem')
+    ProductOccupancy = apps.get_model('rental', 'ProductOccupancy')
+    today = date.today()
+    reserved = defaultdict(int)
+    items = (
+        OrderItem.objects.filter(order__end_date__gte=today)
+        .exclude(order__status='Cancelled')
+        .values_list('product_id', 'quantity', 'order__start_date', 'order__end_date')
+    )
+    for product_id, quantity, start_date, end_date in items.iterator(chunk_size=5000):
+        for offset in range(max((end_date - start_date).days, 1)):
+            day = start_date + timedelta(days=offset)
+            if day >= today:
+                reserved[(product_id, day)] += quantity
+    ProductOccupancy.objects.bulk_create(
+        [ProductOccupancy(product_id=p, day=d, reserved=r) for (p, d), r in reserved.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0013_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units',
+            field=models.PositiveIntegerField(default=1, help_text='Number of identical units available to rent.'),
+        ),
+        migrations.CreateModel(
+            name='ProductOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reserved', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='rental.product')),
+            ],
+            options={
+                'unique_together': {('product', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
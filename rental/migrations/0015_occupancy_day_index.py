@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0014_product_units_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productoccupancy',
+            index=models.Index(fields=['day', 'product'], name='occupancy_day_idx'),
+        ),
+    ]
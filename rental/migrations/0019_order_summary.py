@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    Order = apps.get_model('rental', 'Order')
+    OrderItem = apps.get_model('rental', 'OrderItem')
+    batch = []
+    for order in Order.objects.only('id').iterator(chunk_size=1000):
+        items = list(OrderItem.objects.filter(order=order).select_related('product').order_by('id'))
+        order.item_count = sum(item.quantity for item in items)
+        if items:
+            order.first_product_name = items[0].product.name
+            order.first_product_image = items[0].product.image.name or ''
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, ['item_count', 'first_product_name', 'first_product_image'])
+            batch = []
+    Order.objects.bulk_update(batch, ['item_count', 'first_product_name', 'first_product_image'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0018_savedcart'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='first_product_image',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='first_product_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
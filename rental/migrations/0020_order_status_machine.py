@@ -0,0 +1,70 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Free-text statuses used before the state machine
+LEGACY_STATUSES = {
+    'Processing': 'Confirmed',
+    'Shipped': 'Out',
+    'Completed': 'Returned',
+}
+
+
+def map_legacy_statuses(apps, schema_editor):
+    Order = apps.get_model('rental', 'Order')
+    for old, new in LEGACY_STATUSES.items():
+        Order.objects.filter(status=old).update(status=new)
+    known = ['Pending', 'Confirmed', 'Out', 'Returned', 'Overdue', 'Cancelled']
+    Order.objects.exclude(status__in=known).update(status='Pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0019_order_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Out', 'Out'), ('Returned', 'Returned'), ('Overdue', 'Overdue'), ('Cancelled', 'Cancelled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Out', 'Out'), ('Returned', 'Returned'), ('Overdue', 'Overdue'), ('Cancelled', 'Cancelled')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('note', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['-changed_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Out', 'Out'), ('Returned', 'Returned'), ('Overdue', 'Overdue'), ('Cancelled', 'Cancelled')], default='Pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'end_date'], name='order_status_end_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderstatuschange',
+            name='changed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderstatuschange',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='rental.order'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatuschange',
+            index=models.Index(fields=['order', '-changed_at'], name='order_status_history_idx'),
+        ),
+        migrations.RunPython(map_legacy_statuses, migrations.RunPython.noop),
+    ]
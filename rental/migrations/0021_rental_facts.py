@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0020_order_status_machine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_order_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RentalFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('unit_days', models.IntegerField(default=0)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'category'], name='fact_day_category_idx'), models.Index(fields=['day', 'brand'], name='fact_day_brand_idx')],
+                'unique_together': {('day', 'product', 'city')},
+            },
+        ),
+    ]
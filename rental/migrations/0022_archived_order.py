@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0021_rental_facts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('is_delivery', models.BooleanField(default=False)),
+                ('delivery_name', models.CharField(blank=True, max_length=100)),
+                ('delivery_phone', models.CharField(blank=True, max_length=20)),
+                ('delivery_address', models.TextField(blank=True)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('zip_code', models.CharField(blank=True, max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Out', 'Out'), ('Returned', 'Returned'), ('Overdue', 'Overdue'), ('Cancelled', 'Cancelled')], max_length=20)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('first_product_name', models.CharField(blank=True, max_length=100)),
+                ('first_product_image', models.CharField(blank=True, max_length=255)),
+                ('items', models.JSONField(default=list)),
+                ('status_history', models.JSONField(default=list)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='archived_order_history_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0022_archived_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WishlistEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price_drop', 'Price drop'), ('available', 'Available again')], max_length=20)),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='wishlist_event_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_account_profiles(apps, schema_editor):
+    AccountProfile = apps.get_model('rental', 'AccountProfile')
+
+    def address(*parts):
+        return ', '.join(part for part in parts if part)[:255]
+
+    sources = [
+        ('individual', 'IndividualProfile', lambda p: (
+            p.full_name, p.mobile_phone,
+            address(p.street, p.building and f"Building {p.building}", p.floor and f"Floor {p.floor}",
+                    p.apartment and f"Apt {p.apartment}"),
+            p.city,
+        )),
+        ('corporate', 'CorporateProfile', lambda p: (p.company_name, p.mobile_phone, address(p.company_address), p.city)),
+        ('studio', 'StudioProfile', lambda p: (p.studio_name, p.phone, '', '')),
+    ]
+    for profile_type, model_name, fields in sources:
+        model = apps.get_model('rental', model_name)
+        rows = []
+        for profile in model.objects.iterator(chunk_size=1000):
+            display_name, phone, street, city = fields(profile)
+            rows.append(AccountProfile(
+                user_id=profile.user_id, profile_type=profile_type,
+                display_name=display_name[:100], phone=phone[:20], address=street, city=city[:100],
+            ))
+        AccountProfile.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('rental', '0023_wishlist_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='account_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('profile_type', models.CharField(choices=[('individual', 'Individual'), ('corporate', 'Corporate'), ('studio', 'Studio')], max_length=20)),
+                ('display_name', models.CharField(blank=True, max_length=100)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('address', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_account_profiles, migrations.RunPython.noop),
+    ]
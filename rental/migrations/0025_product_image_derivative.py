@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0024_account_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('file', models.CharField(max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('source', models.CharField(max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_derivatives', to='rental.product')),
+            ],
+            options={
+                'ordering': ['width'],
+                'unique_together': {('product', 'format', 'width')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0026_product_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brand',
+            name='logo',
+            field=models.ImageField(max_length=255, upload_to='brands/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount', 'created_at'], name='mediablob_gc_idx')],
+            },
+        ),
+    ]
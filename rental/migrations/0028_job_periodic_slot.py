@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0027_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='periodic',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('periodic', True)), fields=('name', 'run_after'), name='job_periodic_slot_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0028_job_periodic_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studioprofile',
+            name='governorate',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='studioprofile',
+            name='hear_about',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='studioprofile',
+            name='id_front',
+            field=models.FileField(blank=True, upload_to='ids/studio/'),
+        ),
+        migrations.AddField(
+            model_name='studioprofile',
+            name='id_rear',
+            field=models.FileField(blank=True, upload_to='ids/studio/'),
+        ),
+        migrations.AddField(
+            model_name='studioprofile',
+            name='profile_link',
+            field=models.URLField(blank=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:15
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    apps.get_model('rental', 'MediaBlob').objects.update(touched_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0029_studioprofile_documents'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mediablob',
+            name='mediablob_gc_idx',
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='touched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(fields=['refcount', 'touched_at'], name='mediablob_gc_idx'),
+        ),
+    ]
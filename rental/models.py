@@ -1,5 +1,7 @@
 #type:ignore
+from django.core.files.storage import default_storage
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -14,7 +16,7 @@ class Category(models.Model):
 
 class Brand(models.Model):
     name = models.CharField(max_length=100)
-    logo = models.CharField(max_length=255)
+    logo = models.ImageField(upload_to='brands/', max_length=255)
 
     def __str__(self):
         return self.name 
@@ -24,13 +26,48 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='products/')
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    units = models.PositiveIntegerField(default=1, help_text="Number of identical units available to rent.")
+    # Filled in off the request path by rental/images.py
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False, help_text="Tiny blurred preview as a data URI.")
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
 
+    class Meta:
+        indexes = [
+            # Keyset pagination orderings for the catalog grids
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
 
+class ProductImageDerivative(models.Model):
+    """A resized/re-encoded copy of Product.image, built by rental/images.py."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_derivatives')
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.CharField(max_length=255)
+    size = models.PositiveIntegerField(default=0)
+    # Product.image.name the derivative was built from
+    source = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ('product', 'format', 'width')
+        ordering = ['width']
+
+    def __str__(self):
+        return self.file
+
+    @property
+    def url(self):
+        return default_storage.url(self.file)
+
+
 class WishlistItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -44,6 +81,30 @@ class WishlistItem(models.Model):
 
 
 class Order(models.Model):
+    PENDING = 'Pending'
+    CONFIRMED = 'Confirmed'
+    OUT = 'Out'
+    RETURNED = 'Returned'
+    OVERDUE = 'Overdue'
+    CANCELLED = 'Cancelled'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (CONFIRMED, 'Confirmed'),
+        (OUT, 'Out'),
+        (RETURNED, 'Returned'),
+        (OVERDUE, 'Overdue'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    # Allowed status changes: current status -> next statuses
+    TRANSITIONS = {
+        PENDING: (CONFIRMED, CANCELLED),
+        CONFIRMED: (OUT, CANCELLED),
+        OUT: (RETURNED, OVERDUE),
+        OVERDUE: (RETURNED,),
+        RETURNED: (),
+        CANCELLED: (),
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_delivery = models.BooleanField(default=False)
@@ -55,13 +116,60 @@ class Order(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.CharField(max_length=20, default='Pending')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    # Denormalized line summary for order lists, written when the order is placed
+    item_count = models.PositiveIntegerField(default=0)
+    first_product_name = models.CharField(max_length=100, blank=True)
+    first_product_image = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
+    is_archived = False
+
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS.get(self.status, ())
+
+    @property
+    def first_product_image_url(self):
+        if not self.first_product_image:
+            return ''
+        return default_storage.url(self.first_product_image)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of a customer's order history
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+            # Time-based status sweeps (e.g. Out past end_date -> Overdue)
+            models.Index(fields=['status', 'end_date'], name='order_status_end_idx'),
+        ]
+        constraints = [
+            # A replayed checkout submission must not create a second order.
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='order_user_idempotency_key_uniq',
+            ),
+        ]
+
+class OrderStatusChange(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    note = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-changed_at']
+        indexes = [models.Index(fields=['order', '-changed_at'], name='order_status_history_idx')]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -71,12 +179,214 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Cold copy of a closed order moved out of Order/OrderItem by
+    ``manage.py archive_orders``. Keeps the original id; lines and status
+    history are kept as JSON.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    created_at = models.DateTimeField()
+    is_delivery = models.BooleanField(default=False)
+    delivery_name = models.CharField(max_length=100, blank=True)
+    delivery_phone = models.CharField(max_length=20, blank=True)
+    delivery_address = models.TextField(blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    zip_code = models.CharField(max_length=10, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    item_count = models.PositiveIntegerField(default=0)
+    first_product_name = models.CharField(max_length=100, blank=True)
+    first_product_image = models.CharField(max_length=255, blank=True)
+    items = models.JSONField(default=list)
+    status_history = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+    first_product_image_url = Order.first_product_image_url
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='archived_order_history_idx')]
+
+    def __str__(self):
+        return f"Archived order #{self.id}"
+
+
+class ProductOccupancy(models.Model):
+    """Units of a product reserved on a given day; the availability index."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='occupancy')
+    day = models.DateField()
+    reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'day')
+        indexes = [models.Index(fields=['day', 'product'], name='occupancy_day_idx')]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.day}: {self.reserved}"
+
+
+class WishlistEvent(models.Model):
+    """A product change wishlist watchers should hear about, fanned out by the job worker."""
+    PRICE_DROP = 'price_drop'
+    AVAILABLE = 'available'
+    KIND_CHOICES = [
+        (PRICE_DROP, 'Price drop'),
+        (AVAILABLE, 'Available again'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Window that opened up, for AVAILABLE; empty when more units were added
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['processed_at', 'id'], name='wishlist_event_queue_idx')]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for product {self.product_id}"
+
+
+class ProductRentalDaily(models.Model):
+    """Per-product rentals bucketed by the day the order was placed."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_rentals')
+    day = models.DateField()
+    rentals = models.PositiveIntegerField(default=0)
+    rental_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'day')
+        indexes = [models.Index(fields=['day'])]
+
+
+class ProductPopularity(models.Model):
+    """Materialized best-seller ranking, one row per product per time window."""
+    WINDOW_7D = '7d'
+    WINDOW_30D = '30d'
+    WINDOW_ALL = 'all'
+    WINDOW_CHOICES = [
+        (WINDOW_7D, 'Last 7 days'),
+        (WINDOW_30D, 'Last 30 days'),
+        (WINDOW_ALL, 'All time'),
+    ]
+    WINDOW_DAYS = {WINDOW_7D: 7, WINDOW_30D: 30, WINDOW_ALL: None}
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='popularity')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    window = models.CharField(max_length=3, choices=WINDOW_CHOICES)
+    rentals = models.PositiveIntegerField(default=0)
+    rental_days = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product', 'window')
+        indexes = [
+            models.Index(fields=['window', '-rentals', '-rental_days'], name='popularity_rank_idx'),
+            models.Index(fields=['window', 'category', '-rentals', '-rental_days'], name='popularity_cat_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} ({self.window}): {self.rentals}"
     
 
 
 
 
 
+class RentalFact(models.Model):
+    """
+    Daily analytics rollup: one row per rental day, product and delivery city
+    (blank for pickup). Revenue and unit-days are spread over the days the
+    gear is out. Reports read only this table.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name='+')
+    city = models.CharField(max_length=100, blank=True)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unit_days = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'product', 'city')
+        indexes = [
+            models.Index(fields=['day', 'category'], name='fact_day_category_idx'),
+            models.Index(fields=['day', 'brand'], name='fact_day_brand_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.city or 'pickup'}"
+
+
+class RollupState(models.Model):
+    """High-water mark of orders already folded into the rollups."""
+    name = models.CharField(max_length=50, unique=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_order_id}"
+
+
+class SavedCart(models.Model):
+    """Write-behind copy of cache-backed carts, flushed by the job worker."""
+    cart_id = models.CharField(max_length=32, unique=True)
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.cart_id
+
+
+class Job(models.Model):
+    """Outbox row for work done after the request, drained by ``manage.py run_jobs``."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    # Periodic runs are queued at slot boundaries, at most once per slot.
+    periodic = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_queue_idx')]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'run_after'], condition=models.Q(periodic=True), name='job_periodic_slot_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
 class BaseProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     mobile_phone = models.CharField(max_length=20)
@@ -129,7 +439,60 @@ class StudioProfile(models.Model):
     whatsapp = models.CharField(max_length=20)
     email = models.EmailField(default="temp@example.com")
     studio_name = models.CharField(max_length=100)  # ✅ add this field
+    id_front = models.FileField(upload_to='ids/studio/', blank=True)
+    id_rear = models.FileField(upload_to='ids/studio/', blank=True)
+    profile_link = models.URLField(blank=True)
+    hear_about = models.CharField(max_length=50, blank=True)
+    governorate = models.CharField(max_length=50, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)  # ✅ add this field
 
     def __str__(self):
         return self.studio_name
+
+
+class AccountProfile(models.Model):
+    """
+    One row per user with a registration profile: which kind it is and the
+    contact details checkout needs, copied from the profile table on save.
+    """
+    INDIVIDUAL = 'individual'
+    CORPORATE = 'corporate'
+    STUDIO = 'studio'
+    TYPE_CHOICES = [
+        (INDIVIDUAL, 'Individual'),
+        (CORPORATE, 'Corporate'),
+        (STUDIO, 'Studio'),
+    ]
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='account_profile')
+    profile_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    display_name = models.CharField(max_length=100, blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    address = models.CharField(max_length=255, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} ({self.profile_type})"
+
+    @property
+    def profile(self):
+        """The full Individual/Corporate/StudioProfile, joined in by the resolver."""
+        return getattr(self.user, f'{self.profile_type}profile', None)
+
+
+class MediaBlob(models.Model):
+    """A file in the content-addressed media storage (rental/storage.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    # Rows naming this file, as of the last recount
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last time an upload stored or reused this file; collect's grace period runs from here
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['refcount', 'touched_at'], name='mediablob_gc_idx')]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,124 @@
+# type: ignore
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue_many
+from .models import Product, WishlistEvent, WishlistItem
+
+
+EVENT_BATCH_SIZE = 500
+WATCHER_CHUNK_SIZE = 2000
+DIGEST_BATCH_SIZE = 500
+
+
+def record_price_change(product, old_price):
+    """Called on Product save; only drops are worth telling watchers about."""
+    if old_price is not None and product.price < old_price:
+        WishlistEvent.objects.create(
+            product=product, kind=WishlistEvent.PRICE_DROP, old_price=old_price, new_price=product.price,
+        )
+
+
+def record_available(product_ids, start_date=None, end_date=None):
+    WishlistEvent.objects.bulk_create([
+        WishlistEvent(product_id=product_id, kind=WishlistEvent.AVAILABLE, start_date=start_date, end_date=end_date)
+        for product_id in product_ids
+    ])
+
+
+def coalesce(events):
+    """
+    Collapse raw events into one entry per product and kind: repeated price
+    drops become a single drop from the first old price to the latest price,
+    and opened windows are listed once each.
+    """
+    products = Product.objects.only('id', 'name', 'price').in_bulk({event.product_id for event in events})
+    merged = {}
+    for event in events:
+        product = products.get(event.product_id)
+        if product is None:
+            continue
+        entry = merged.setdefault((event.product_id, event.kind), {
+            'product_id': product.id,
+            'product_name': product.name,
+            'kind': event.kind,
+            'price': str(product.price),
+        })
+        if event.kind == WishlistEvent.PRICE_DROP:
+            entry.setdefault('old_price', str(event.old_price))
+        elif event.start_date:
+            window = [event.start_date.isoformat(), event.end_date.isoformat()]
+            windows = entry.setdefault('windows', [])
+            if window not in windows:
+                windows.append(window)
+    # A drop that was undone by a later rise is no longer news.
+    return {
+        key: entry for key, entry in merged.items()
+        if entry['kind'] != WishlistEvent.PRICE_DROP or Decimal(entry['price']) < Decimal(entry['old_price'])
+    }
+
+
+def fan_out():
+    """
+    Turn pending WishlistEvents into one ``wishlist_digest`` job per watcher.
+
+    Watchers are streamed from a single WishlistItem join ordered by user,
+    so each user's rows arrive together and become one digest covering every
+    product they watch; jobs are written with bulk inserts. Returns the
+    number of digests queued.
+    """
+    queued = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                WishlistEvent.objects.select_for_update()
+                .filter(processed_at__isnull=True)
+                .order_by('id')[:EVENT_BATCH_SIZE]
+            )
+            if not events:
+                return queued
+            entries = coalesce(events)
+            by_product = {}
+            for (product_id, _), entry in entries.items():
+                by_product.setdefault(product_id, []).append(entry)
+
+            watchers = (
+                WishlistItem.objects.filter(product_id__in=by_product)
+                .exclude(user__email='')
+                .order_by('user_id', 'product_id')
+                .values_list('user_id', 'user__email', 'user__username', 'product_id')
+                .iterator(chunk_size=WATCHER_CHUNK_SIZE)
+            )
+            payloads, digest = [], None
+            for user_id, email, username, product_id in watchers:
+                if digest is None or digest['user_id'] != user_id:
+                    digest = {'user_id': user_id, 'email': email, 'username': username, 'events': []}
+                    payloads.append(digest)
+                    if len(payloads) > DIGEST_BATCH_SIZE:
+                        # Everything but the digest still being filled is complete.
+                        enqueue_many('wishlist_digest', payloads[:-1])
+                        queued += len(payloads) - 1
+                        payloads = payloads[-1:]
+                digest['events'].extend(by_product[product_id])
+            enqueue_many('wishlist_digest', payloads)
+            queued += len(payloads)
+
+            WishlistEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+
+
+def digest_text(username, events):
+    lines = []
+    for event in events:
+        if event['kind'] == WishlistEvent.PRICE_DROP:
+            lines.append(f"- {event['product_name']} is now EGP {event['price']}/day (was EGP {event['old_price']})")
+        elif event.get('windows'):
+            dates = ', '.join(f"{start} to {end}" for start, end in event['windows'])
+            lines.append(f"- {event['product_name']} is free again for {dates}")
+        else:
+            lines.append(f"- {event['product_name']} has more units available")
+    return (
+        f"Hi {username},\n\nThere is news about gear on your RentHub wishlist:\n"
+        + '\n'.join(lines)
+    )
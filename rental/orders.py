@@ -0,0 +1,82 @@
+# type: ignore
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import rolled_up
+from .availability import release
+from .jobs import enqueue, enqueue_many
+from .models import Order, OrderStatusChange
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def transition(order, status, by=None, note=''):
+    """Move one order to ``status``, or raise InvalidTransition."""
+    if not order.can_transition_to(status):
+        raise InvalidTransition(f"Order #{order.id} cannot go from {order.status} to {status}")
+    changed = bulk_transition(Order.objects.filter(pk=order.pk, status=order.status), status, by=by, note=note)
+    if not changed:
+        raise InvalidTransition(f"Order #{order.id} changed status concurrently")
+    order.status = status
+    return order
+
+
+def bulk_transition(queryset, status, by=None, note='', batch_size=500):
+    """
+    Move every order in ``queryset`` that is allowed to reach ``status``.
+
+    Works set-wise, one batch of ids at a time: the batch's rows are locked,
+    flipped with a single UPDATE, and get their history rows and
+    notification jobs with one bulk insert each. Orders whose current status
+    does not allow the change are left alone. Returns the number changed.
+    """
+    sources = [current for current, targets in Order.TRANSITIONS.items() if status in targets]
+    changed = 0
+    for source in sources:
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    queryset.filter(status=source)
+                    .select_for_update()
+                    .order_by('id')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                count = Order.objects.filter(id__in=ids, status=source).update(status=status)
+                moved = ids
+                if count != len(ids):
+                    # Some rows moved on before the UPDATE (select_for_update is a
+                    # no-op on SQLite); side effects only for the rows it changed.
+                    moved = list(Order.objects.filter(id__in=ids, status=status).values_list('id', flat=True))
+                now = timezone.now()
+                OrderStatusChange.objects.bulk_create([
+                    OrderStatusChange(
+                        order_id=order_id, from_status=source, to_status=status,
+                        changed_at=now, changed_by=by, note=note,
+                    ) for order_id in moved
+                ])
+                enqueue_many('order_status_changed', [
+                    {'order_id': order_id, 'old_status': source, 'new_status': status} for order_id in moved
+                ])
+                if status == Order.CANCELLED:
+                    for order in Order.objects.filter(id__in=moved).only('id', 'start_date', 'end_date'):
+                        release(order)
+                    retract = rolled_up(moved)
+                    if retract:
+                        enqueue('retract_rollups', order_ids=retract)
+                changed += count
+            if len(ids) < batch_size:
+                break
+    return changed
+
+
+def mark_overdue(today=None, batch_size=500):
+    """Out orders whose end_date has passed become Overdue."""
+    today = today or timezone.localdate()
+    return bulk_transition(
+        Order.objects.filter(end_date__lt=today), Order.OVERDUE,
+        note="End date passed", batch_size=batch_size,
+    )
@@ -0,0 +1,92 @@
+# type: ignore
+from datetime import date
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+
+CURSOR_SALT = 'rental.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a stable ordering such as ``('-price', '-id')``.
+
+    The last field must be unique (normally ``id``). Each page is fetched with
+    a ``WHERE (sort_key, id) > (last_key, last_id)`` seek instead of OFFSET,
+    so page 500 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def _fields(self):
+        return [(f.lstrip('-'), f.startswith('-')) for f in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self._fields():
+            value = getattr(obj, name)
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif isinstance(value, date):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(values, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return values
+
+    def _seek(self, values):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND (b > y OR (b = y AND c > z)))
+        condition = None
+        for (name, descending), value in reversed(list(zip(self._fields(), values))):
+            lookup = '%s__%s' % (name, 'lt' if descending else 'gt')
+            step = Q(**{lookup: value})
+            if condition is not None:
+                step |= Q(**{name: value}) & condition
+            condition = step
+        # Redundant range on the leading key lets the index bound the scan.
+        name, descending = self._fields()[0]
+        leading = Q(**{'%s__%s' % (name, 'lte' if descending else 'gte'): values[0]})
+        return leading & condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek(self.decode_cursor(cursor)))
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
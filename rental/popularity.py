@@ -0,0 +1,116 @@
+# type: ignore
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ArchivedOrder, OrderItem, Product, ProductRentalDaily, ProductPopularity
+
+
+def record_order(order, items=None):
+    """Fold a newly placed order into the daily buckets and every ranking window."""
+    if items is None:
+        items = order.items.select_related('product')
+    days = (order.end_date - order.start_date).days or 1
+    day = timezone.localdate(order.created_at)
+
+    totals = defaultdict(lambda: [0, 0])
+    categories = {}
+    for item in items:
+        totals[item.product_id][0] += item.quantity
+        totals[item.product_id][1] += item.quantity * days
+        categories[item.product_id] = item.product.category_id
+
+    # Make sure every counter row exists, then add to them. Products that got
+    # the same increment share one UPDATE, so a typical cart costs a handful
+    # of statements whatever its size.
+    ProductRentalDaily.objects.bulk_create(
+        [ProductRentalDaily(product_id=product_id, day=day) for product_id in totals],
+        ignore_conflicts=True,
+    )
+    ProductPopularity.objects.bulk_create(
+        [ProductPopularity(product_id=product_id, category_id=categories[product_id], window=window)
+         for product_id in totals for window in ProductPopularity.WINDOW_DAYS],
+        ignore_conflicts=True,
+    )
+
+    groups = defaultdict(list)
+    for product_id, (rentals, rental_days) in totals.items():
+        groups[(rentals, rental_days)].append(product_id)
+    for (rentals, rental_days), product_ids in groups.items():
+        increment = {'rentals': F('rentals') + rentals, 'rental_days': F('rental_days') + rental_days}
+        ProductRentalDaily.objects.filter(product_id__in=product_ids, day=day).update(**increment)
+        ProductPopularity.objects.filter(product_id__in=product_ids).update(**increment)
+
+
+def rebuild_daily():
+    """Recompute the daily buckets from scratch, from live and archived orders."""
+    rows = defaultdict(lambda: [0, 0])
+
+    def add(product_id, quantity, created_at, start_date, end_date):
+        key = (product_id, timezone.localdate(created_at))
+        rows[key][0] += quantity
+        rows[key][1] += quantity * ((end_date - start_date).days or 1)
+
+    items = OrderItem.objects.values_list(
+        'product_id', 'quantity', 'order__created_at', 'order__start_date', 'order__end_date',
+    ).iterator(chunk_size=5000)
+    for item in items:
+        add(*item)
+
+    # Archived lines may name products deleted since; those cannot be ranked.
+    products = set(Product.objects.values_list('id', flat=True))
+    archived = ArchivedOrder.objects.values_list('items', 'created_at', 'start_date', 'end_date')
+    for lines, created_at, start_date, end_date in archived.iterator(chunk_size=1000):
+        for line in lines:
+            if line['product_id'] in products:
+                add(line['product_id'], line['quantity'], created_at, start_date, end_date)
+
+    with transaction.atomic():
+        ProductRentalDaily.objects.all().delete()
+        ProductRentalDaily.objects.bulk_create(
+            [ProductRentalDaily(product_id=p, day=d, rentals=r, rental_days=rd)
+             for (p, d), (r, rd) in rows.items()],
+            batch_size=1000,
+        )
+
+
+def refresh_windows(windows=None):
+    """
+    Rebuild the ranking windows from the daily buckets. The incremental path
+    only ever adds, so this is what ages old rentals out of 7d/30d.
+    """
+    today = timezone.localdate()
+    for window in windows or ProductPopularity.WINDOW_DAYS:
+        span = ProductPopularity.WINDOW_DAYS[window]
+        daily = ProductRentalDaily.objects.all()
+        if span:
+            daily = daily.filter(day__gt=today - timedelta(days=span))
+        totals = (
+            daily.values('product_id', 'product__category_id')
+            .annotate(total_rentals=Sum('rentals'), total_days=Sum('rental_days'))
+            .filter(total_rentals__gt=0)
+        )
+        with transaction.atomic():
+            ProductPopularity.objects.filter(window=window).delete()
+            ProductPopularity.objects.bulk_create(
+                [ProductPopularity(
+                    product_id=row['product_id'],
+                    category_id=row['product__category_id'],
+                    window=window,
+                    rentals=row['total_rentals'],
+                    rental_days=row['total_days'],
+                ) for row in totals],
+                batch_size=1000,
+            )
+
+
+def top_products(window=ProductPopularity.WINDOW_ALL, category=None, limit=10):
+    """Top-N products for a window, optionally within one category."""
+    ranking = ProductPopularity.objects.filter(window=window)
+    if category is not None:
+        ranking = ranking.filter(category=category)
+    ranking = ranking.select_related('product').order_by('-rentals', '-rental_days')[:limit]
+    return [row.product for row in ranking]
@@ -0,0 +1,66 @@
+# type: ignore
+from .models import AccountProfile, CorporateProfile, IndividualProfile, StudioProfile
+
+
+PROFILE_TYPES = {
+    IndividualProfile: AccountProfile.INDIVIDUAL,
+    CorporateProfile: AccountProfile.CORPORATE,
+    StudioProfile: AccountProfile.STUDIO,
+}
+
+
+def join_address(*parts):
+    return ', '.join(part for part in parts if part)[:255]
+
+
+def account_fields(profile):
+    """The AccountProfile columns for an Individual/Corporate/StudioProfile."""
+    if isinstance(profile, IndividualProfile):
+        return {
+            'display_name': profile.full_name,
+            'phone': profile.mobile_phone,
+            'address': join_address(
+                profile.street,
+                profile.building and f"Building {profile.building}",
+                profile.floor and f"Floor {profile.floor}",
+                profile.apartment and f"Apt {profile.apartment}",
+            ),
+            'city': profile.city,
+        }
+    if isinstance(profile, CorporateProfile):
+        return {
+            'display_name': profile.company_name,
+            'phone': profile.mobile_phone,
+            'address': join_address(profile.company_address),
+            'city': profile.city,
+        }
+    return {'display_name': profile.studio_name, 'phone': profile.phone, 'address': '', 'city': ''}
+
+
+def sync_account_profile(profile):
+    """Upsert the user's AccountProfile from ``profile`` in one statement."""
+    fields = account_fields(profile)
+    AccountProfile.objects.bulk_create(
+        [AccountProfile(user_id=profile.user_id, profile_type=PROFILE_TYPES[type(profile)], **fields)],
+        update_conflicts=True, unique_fields=['user'],
+        update_fields=['profile_type', *fields, 'updated_at'],
+    )
+
+
+def resolve_profile(request):
+    """
+    The signed-in user's AccountProfile, with the full profile row joined
+    in (``.profile``), in one query; cached on the request. None for
+    anonymous users and users without a registration profile.
+    """
+    if '_account_profile' not in request.__dict__:
+        profile = None
+        if request.user.is_authenticated:
+            profile = (
+                AccountProfile.objects
+                .select_related('user__individualprofile', 'user__corporateprofile', 'user__studioprofile')
+                .filter(user_id=request.user.pk)
+                .first()
+            )
+        request._account_profile = profile
+    return request._account_profile
@@ -0,0 +1,73 @@
+# type: ignore
+import os
+
+from django.conf import settings
+from django.db import transaction
+
+from .catalog_cache import FileVersionStore
+from .models import AccountProfile
+
+
+SESSION_KEY = 'roles'
+
+
+class Roles:
+    """A user's group names and profile type."""
+
+    def __init__(self, groups=(), profile_type=None):
+        self.groups = frozenset(groups)
+        self.profile_type = profile_type
+
+    def __contains__(self, group_name):
+        return group_name in self.groups
+
+    def __repr__(self):
+        return f"Roles({sorted(self.groups)!r}, {self.profile_type!r})"
+
+
+ANONYMOUS = Roles()
+
+
+def get_version_store(user_id):
+    root = getattr(settings, 'ROLES_VERSION_DIR', settings.BASE_DIR / '.role_versions')
+    return FileVersionStore(os.path.join(root, str(user_id)))
+
+
+def bump_version(user_id):
+    """Make every session of ``user_id`` reload its roles once the current transaction commits."""
+    # After commit, so no request can store the old roles under the new version.
+    transaction.on_commit(get_version_store(user_id).bump)
+
+
+def load_roles(user):
+    """Groups and profile type from the database, in two queries."""
+    groups = list(user.groups.values_list('name', flat=True))
+    profile_type = AccountProfile.objects.filter(user_id=user.pk).values_list('profile_type', flat=True).first()
+    return Roles(groups, profile_type)
+
+
+def get_roles(request):
+    """
+    The current user's Roles. Kept in the session as
+    ``[version, groups, profile_type]`` and reloaded only when the user's
+    version moves (group or profile changes), so checks cost no queries.
+    Versions live in a FileVersionStore: shared by every process, kept
+    across restarts and only ever increasing, so a session's version can
+    never match again after a change.
+    """
+    roles = request.__dict__.get('_roles')
+    if roles is not None:
+        return roles
+    user = request.user
+    if not user.is_authenticated:
+        return ANONYMOUS
+
+    version = get_version_store(user.id).get()
+    stored = request.session.get(SESSION_KEY)
+    if stored and stored[0] == version:
+        roles = Roles(stored[1], stored[2])
+    else:
+        roles = load_roles(user)
+        request.session[SESSION_KEY] = [version, sorted(roles.groups), roles.profile_type]
+    request._roles = roles
+    return roles
@@ -0,0 +1,130 @@
+# type: ignore
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+FTS_TABLE = 'rental_product_fts'
+
+# Arabic letter variants that users type interchangeably.
+ARABIC_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,  # tatweel
+})
+ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Fold case, accents, Arabic diacritics/letter variants and digits."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.translate(ARABIC_FOLD).translate(ARABIC_DIGITS)
+    return text.casefold()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+# --------------------------- Backends ---------------------------
+
+class BaseSearchBackend:
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self, products):
+        pass
+
+    def filter(self, queryset, query):
+        """Restrict ``queryset`` to matches, annotated with ``search_rank`` (lower is better)."""
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """LIKE-based fallback for databases without a full-text index."""
+
+    def filter(self, queryset, query):
+        terms = query.split()
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """BM25-ranked prefix search over an FTS5 table keyed by product id."""
+
+    # Name matches outrank description matches.
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                [product.pk, normalize(product.name), normalize(product.description)],
+            )
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+    def rebuild(self, products):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                [(p.pk, normalize(p.name), normalize(p.description)) for p in products],
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    def match_expression(self, query):
+        # Every term must match, each as a prefix: "can"* "50"*
+        terms = tokenize(query)
+        return ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        column = '%s.%s' % (connection.ops.quote_name(queryset.model._meta.db_table), connection.ops.quote_name('id'))
+        # bm25() only works inside an FTS query, so the rank is a correlated
+        # lookup of the outer row in the same MATCH.
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {column}',
+            [self.name_weight, self.description_weight, match],
+            output_field=FloatField(),
+        )
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'RENTAL_SEARCH_BACKEND', 'rental.search.SQLiteFTS5Backend')
+        backend_class = import_string(path)
+        if backend_class is SQLiteFTS5Backend and connection.vendor != 'sqlite':
+            backend_class = SimpleSearchBackend
+        _backend = backend_class()
+    return _backend
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` by ``query`` and order it best match first."""
+    return get_backend().filter(queryset, query).order_by('search_rank', 'id')
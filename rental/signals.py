@@ -0,0 +1,131 @@
+# type: ignore
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category, Brand, IndividualProfile, CorporateProfile, StudioProfile
+from .search import get_backend
+from .catalog_cache import bump_version
+from .cart import get_cart_store
+from . import availability, notifications, roles
+from .jobs import enqueue
+from .models import AccountProfile
+from .profiles import PROFILE_TYPES, sync_account_profile
+
+
+# --------------------------- Search index ---------------------------
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+# --------------------------- Catalog cache ---------------------------
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    # After commit, so no request can cache the old rows under the new version.
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_availability(sender, instance, created, **kwargs):
+    # A change in units can turn days full or free again.
+    if not created:
+        transaction.on_commit(availability.bump_version)
+
+
+
+# --------------------------- Wishlist notifications ---------------------------
+
+@receiver(post_init, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not loaded.
+    instance._loaded_price = instance.__dict__.get('price')
+    instance._loaded_units = instance.__dict__.get('units')
+    image = instance.__dict__.get('image')
+    instance._loaded_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Product)
+def record_wishlist_events(sender, instance, created, **kwargs):
+    if created:
+        return
+    notifications.record_price_change(instance, instance._loaded_price)
+    if instance._loaded_units is not None and instance.units > instance._loaded_units:
+        notifications.record_available([instance.pk])
+    instance._loaded_price = instance.price
+    instance._loaded_units = instance.units
+
+
+# --------------------------- Role cache ---------------------------
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_for_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        roles.bump_version(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): pk_set is not given, so collect the members first
+        for user_id in instance.user_set.values_list('pk', flat=True):
+            roles.bump_version(user_id)
+    elif pk_set:
+        for user_id in pk_set:
+            roles.bump_version(user_id)
+
+
+@receiver(post_save, sender=IndividualProfile)
+@receiver(post_delete, sender=IndividualProfile)
+@receiver(post_save, sender=CorporateProfile)
+@receiver(post_delete, sender=CorporateProfile)
+@receiver(post_save, sender=StudioProfile)
+@receiver(post_delete, sender=StudioProfile)
+def invalidate_roles_for_profile(sender, instance, **kwargs):
+    roles.bump_version(instance.user_id)
+
+
+# --------------------------- Account profile ---------------------------
+
+@receiver(post_save, sender=IndividualProfile)
+@receiver(post_save, sender=CorporateProfile)
+@receiver(post_save, sender=StudioProfile)
+def sync_account(sender, instance, **kwargs):
+    sync_account_profile(instance)
+
+
+@receiver(post_delete, sender=IndividualProfile)
+@receiver(post_delete, sender=CorporateProfile)
+@receiver(post_delete, sender=StudioProfile)
+def remove_account(sender, instance, **kwargs):
+    AccountProfile.objects.filter(user_id=instance.user_id, profile_type=PROFILE_TYPES[sender]).delete()
+
+
+# --------------------------- Image derivatives ---------------------------
+
+@receiver(post_save, sender=Product)
+def queue_image_derivatives(sender, instance, created, **kwargs):
+    if instance.image and (created or instance.image.name != instance._loaded_image):
+        enqueue('product_image_derivatives', product_id=instance.pk)
+    instance._loaded_image = instance.image.name
+
+
+# --------------------------- Cart ---------------------------
+
+@receiver(user_logged_out)
+def forget_cart(sender, request, **kwargs):
+    # Cookie carts outlive the session; the next person on this browser must not inherit them.
+    if request is not None:
+        get_cart_store(request).forget()
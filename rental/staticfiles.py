@@ -0,0 +1,165 @@
+# type: ignore
+import gzip
+import logging
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Extensions worth shipping with precompressed .gz/.br siblings
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map')
+COMPRESS_MIN_SIZE = 256
+
+
+# --------------------------- Minification ---------------------------
+
+_CSS_STRING_OR_COMMENT = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.S)
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace; strings are left untouched."""
+    strings = []
+
+    def stash(match):
+        if match.group(0).startswith('/*'):
+            return ' '
+        strings.append(match.group(0))
+        return f'\x00{len(strings) - 1}\x00'
+
+    css = _CSS_STRING_OR_COMMENT.sub(stash, css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r' ?([{};,>]) ?', r'\1', css)
+    css = re.sub(r'([{;][-\w]+): ', r'\1:', css)
+    css = css.replace(';}', '}').strip()
+    return re.sub(r'\x00(\d+)\x00', lambda match: strings[int(match.group(1))], css)
+
+
+def rebase_urls(css, source, bundle):
+    """Rewrite relative url()s in ``source`` so they resolve from ``bundle``."""
+    def rebase(match):
+        quote, url = match.groups()
+        if url.startswith(('/', '#', 'data:')) or '://' in url:
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f'url({quote}{posixpath.relpath(target, posixpath.dirname(bundle))}{quote})'
+    return _CSS_URL.sub(rebase, css)
+
+
+# --------------------------- Bundles ---------------------------
+
+class BundleFinder(finders.BaseFinder):
+    """
+    Serves the STATIC_BUNDLES: each bundle is its source files (looked up
+    through the other finders) concatenated and minified. Bundles are
+    rebuilt into STATIC_BUNDLES_ROOT whenever a source is newer, so
+    runserver and collectstatic always see the current CSS.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.bundles = getattr(settings, 'STATIC_BUNDLES', {})
+        self.storage = FileSystemStorage(location=settings.STATIC_BUNDLES_ROOT)
+        super().__init__(*args, **kwargs)
+
+    def build(self, name):
+        sources = []
+        for source in self.bundles[name]:
+            path = finders.find(source)
+            if not path:
+                raise FileNotFoundError(f"Static bundle '{name}' lists a missing file '{source}'")
+            sources.append((source, path))
+
+        target = self.storage.path(name)
+        newest = max(os.path.getmtime(path) for _, path in sources)
+        if os.path.exists(target) and os.path.getmtime(target) >= newest:
+            return target
+
+        parts = []
+        for source, path in sources:
+            with open(path, encoding='utf-8') as f:
+                parts.append(rebase_urls(f.read(), source, name))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(minify_css('\n'.join(parts)))
+        return target
+
+    def find(self, path, all=False):
+        if path not in self.bundles:
+            return []
+        target = self.build(path)
+        return [target] if all else target
+
+    def list(self, ignore_patterns):
+        for name in self.bundles:
+            self.build(name)
+            yield name, self.storage
+
+
+# --------------------------- Storage ---------------------------
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files (so they can be cached forever) with
+    ``.gz`` and, when the ``brotli`` package is installed, ``.br``
+    siblings written at collectstatic time for the web server to send as-is.
+
+    A reference to a file that does not exist is left unhashed and logged
+    rather than failing the page or the whole collectstatic run.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            logger.warning("Static file '%s' not found; serving it unhashed", name)
+            self.hashed_files[self.hash_key(self.clean_name(name))] = name
+            return name
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def tolerant(match):
+            try:
+                return converter(match)
+            except ValueError:
+                logger.warning("%s references a missing file: %s", name, match['url'])
+                return match['matched']
+        return tolerant
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
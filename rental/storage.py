@@ -0,0 +1,145 @@
+# type: ignore
+import hashlib
+import os
+import posixpath
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models, transaction
+from django.utils import timezone
+
+
+HASHED_NAME = re.compile(r'(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}(?:\.[\w]+)?$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Uploads younger than this may not be referenced by a row yet.
+GC_GRACE = timedelta(days=1)
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file as ``<upload dir>/<aa>/<sha256><ext>``. Identical
+    uploads share one file, and a name never changes content, so URLs can
+    be cached forever. Each stored file gets a MediaBlob row; ``collect``
+    deletes the ones nothing references any more.
+    """
+
+    def hashed_name(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if not digest:
+            hasher = hashlib.sha256()
+            for chunk in content.chunks():
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+            content.seek(0)
+        directory, filename = posixpath.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        if os.path.splitext(filename)[0] == digest and posixpath.basename(directory) == digest[:2]:
+            return name  # already content-addressed
+        return posixpath.join(directory, digest[:2], digest + ext)
+
+    def get_available_name(self, name, max_length=None):
+        # Same name means same content, so an existing file is simply reused.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            name = super()._save(name, content)
+        MediaBlob = apps.get_model('rental', 'MediaBlob')
+        # Reusing an orphan restarts its grace period: the row naming it may not be committed yet.
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name, size=self.size(name), touched_at=timezone.now())],
+            update_conflicts=True, unique_fields=['name'], update_fields=['touched_at'],
+        )
+        return name
+
+
+# --------------------------- Reference counting ---------------------------
+
+# Plain CharFields that hold storage names
+NAME_FIELDS = (
+    ('rental.Order', 'first_product_image'),
+    ('rental.ArchivedOrder', 'first_product_image'),
+    ('rental.ProductImageDerivative', 'file'),
+)
+
+
+def reference_fields():
+    """Every (model, field name) in the project that points at a stored file."""
+    fields = [(apps.get_model(label), name) for label, name in NAME_FIELDS]
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                fields.append((model, field.name))
+    return fields
+
+
+def recount():
+    """Recompute MediaBlob.refcount from every row that names a file."""
+    MediaBlob = apps.get_model('rental', 'MediaBlob')
+    counts = Counter()
+    for model, field in reference_fields():
+        rows = model._base_manager.exclude(**{field: ''}).values_list(field, flat=True)
+        counts.update(name for name in rows.iterator(chunk_size=5000) if name)
+    blobs = list(MediaBlob.objects.only('id', 'name', 'refcount'))
+    changed = []
+    for blob in blobs:
+        refcount = counts.get(blob.name, 0)
+        if refcount != blob.refcount:
+            blob.refcount = refcount
+            changed.append(blob)
+    MediaBlob.objects.bulk_update(changed, ['refcount'], batch_size=1000)
+    return len(changed)
+
+
+def collect(grace=GC_GRACE, dry_run=False):
+    """Recount, then delete unreferenced blobs not stored or reused within ``grace``. Returns their names."""
+    MediaBlob = apps.get_model('rental', 'MediaBlob')
+    recount()
+    orphans = MediaBlob.objects.filter(refcount=0, touched_at__lt=timezone.now() - grace)
+    names = list(orphans.values_list('name', flat=True))
+    if not dry_run:
+        for name in names:
+            default_storage.delete(name)
+        orphans.delete()
+    return names
+
+
+def adopt(dry_run=False):
+    """
+    Move every referenced file that is not content-addressed yet into the
+    storage, deduplicating it, and repoint all rows naming it. The old
+    files are deleted afterwards. Returns the number of files moved.
+    """
+    fields = reference_fields()
+    legacy = set()
+    for model, field in fields:
+        names = model._base_manager.exclude(**{field: ''}).values_list(field, flat=True).distinct()
+        legacy.update(name for name in names if name and not is_content_addressed(name))
+
+    if dry_run:
+        return sum(1 for name in legacy if default_storage.exists(name))
+    moved = {}
+    for name in sorted(legacy):
+        if default_storage.exists(name):
+            with default_storage.open(name) as f:
+                moved[name] = default_storage.save(name, f)
+    from . import catalog_cache
+
+    for old_name, new_name in moved.items():
+        with transaction.atomic():
+            for model, field in fields:
+                model._base_manager.filter(**{field: old_name}).update(**{field: new_name})
+    # update() skips the model signals, so cached pages would keep the old URLs.
+    if moved:
+        catalog_cache.bump_version()
+    for old_name in moved:
+        default_storage.delete(old_name)
+    return len(moved)
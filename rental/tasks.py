@@ -0,0 +1,131 @@
+# type: ignore
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import mail_managers, send_mail
+from django.utils import timezone
+
+from . import analytics, images, notifications, storage
+from .archive import archive_orders
+from .uploads import downscale_stored
+from .cart import CacheCartStore
+from .jobs import task
+from .models import Order, SavedCart
+from .orders import mark_overdue
+from .popularity import refresh_windows
+
+
+@task('order_placed')
+def order_placed(order_id):
+    order = Order.objects.select_related('user').prefetch_related('items__product').filter(pk=order_id).first()
+    if order is None:
+        return  # deleted (or archived) before the job ran
+    lines = '\n'.join(f"- {item.product.name} x {item.quantity}" for item in order.items.all())
+    if order.user.email:
+        send_mail(
+            f"RentHub order #{order.id} received",
+            f"Hi {order.user.username},\n\n"
+            f"We received your order for {order.start_date} to {order.end_date}:\n{lines}\n\n"
+            f"Total: EGP {order.total_price}",
+            None,
+            [order.user.email],
+        )
+    mail_managers(
+        f"New order #{order.id}",
+        f"{order.user.username} ordered for {order.start_date} to {order.end_date}:\n{lines}",
+    )
+
+
+@task('order_status_changed')
+def order_status_changed(order_id, old_status, new_status):
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None:
+        return
+    if order.user.email:
+        send_mail(
+            f"RentHub order #{order.id} is now {new_status}",
+            f"Hi {order.user.username},\n\nYour order #{order.id} changed from {old_status} to {new_status}.",
+            None,
+            [order.user.email],
+        )
+
+
+@task('user_registered')
+def user_registered(user_id, account_type):
+    user = User.objects.get(pk=user_id)
+    if user.email:
+        send_mail(
+            "Welcome to RentHub",
+            f"Hi {user.username},\n\nThanks for registering a {account_type} account with RentHub.",
+            None,
+            [user.email],
+        )
+    mail_managers(f"New {account_type} registration", f"{user.username} <{user.email}> registered.")
+
+
+@task('wishlist_digest')
+def wishlist_digest(user_id, email, username, events):
+    send_mail("News about your RentHub wishlist", notifications.digest_text(username, events), None, [email])
+
+
+@task('downscale_upload')
+def downscale_upload(model, pk, field, name):
+    downscale_stored(model, pk, field, name)
+
+
+@task('product_image_derivatives', timeout=timedelta(minutes=30))
+def product_image_derivatives(product_id):
+    images.build_derivatives(product_id)
+
+
+@task('retract_rollups')
+def retract_rollups(order_ids):
+    analytics.retract_orders(order_ids)
+
+
+# --------------------------- Periodic ---------------------------
+
+@task('rollup_facts', every=timedelta(minutes=5))
+def rollup_facts():
+    analytics.rollup_new_orders()
+
+
+@task('wishlist_fan_out', every=timedelta(minutes=10))
+def wishlist_fan_out():
+    notifications.fan_out()
+
+
+@task('flush_carts', every=timedelta(minutes=1))
+def flush_carts():
+    CacheCartStore.flush()
+
+
+@task('mark_overdue_orders', every=timedelta(hours=1))
+def mark_overdue_orders():
+    mark_overdue()
+
+
+@task('refresh_popularity', every=timedelta(hours=24), timeout=timedelta(hours=1))
+def refresh_popularity():
+    # Ages old rentals out of the 7d/30d windows.
+    refresh_windows()
+
+
+@task('archive_orders', every=timedelta(hours=24), timeout=timedelta(hours=2))
+def archive_closed_orders():
+    archive_orders()
+
+
+@task('collect_media', every=timedelta(hours=24), timeout=timedelta(hours=2))
+def collect_media():
+    storage.collect()
+
+
+@task('cleanup_sessions', every=timedelta(hours=24))
+def cleanup_sessions():
+    engine = import_module(settings.SESSION_ENGINE)
+    engine.SessionStore.clear_expired()
+    cutoff = timezone.now() - timedelta(seconds=settings.CART_TTL)
+    SavedCart.objects.filter(updated_at__lt=cutoff).delete()
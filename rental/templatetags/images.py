@@ -0,0 +1,48 @@
+# type: ignore
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from rental.images import picture_sources
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 600px) 100vw, 300px'
+
+
+def _img_attrs(product, width=None, height=None):
+    """Size attributes and the inline blurred placeholder, so the box is laid out before the image loads."""
+    width = product.image_width or width
+    height = product.image_height or height
+    attrs = format_html(' width="{}" height="{}"', width, height) if width and height else ''
+    if product.image_placeholder:
+        attrs += format_html(
+            ' style="background-image: url({}); background-size: cover; background-repeat: no-repeat;"',
+            product.image_placeholder,
+        )
+    return attrs
+
+
+@register.simple_tag
+def product_picture(product, sizes=DEFAULT_SIZES, css_class='', loading='lazy'):
+    """
+    ``<picture>`` for a product's image with AVIF/WebP/JPEG ``srcset``s and
+    its placeholder. Prefetch ``image_derivatives`` on lists of products;
+    products without derivatives fall back to the original image.
+    """
+    derivatives = product.image_derivatives.all()
+    fallback, sources = picture_sources(derivatives)
+    if fallback is None:
+        src = product.image.url if product.image else static('rental/images/placeholder.jpg')
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}"{}>',
+            src, product.name, css_class, loading, _img_attrs(product),
+        )
+    src, srcset, width, height = fallback
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+            (mime, source_srcset, sizes) for mime, source_srcset in sources
+        )),
+        src, srcset, sizes, product.name, css_class, loading, _img_attrs(product, width, height),
+    )
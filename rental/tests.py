@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from PIL import Image
+from django.utils import timezone
+
+from django.core import mail
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import (
+    analytics, availability, catalog_cache, checks, exports, images, jobs, notifications, roles, storage, tasks,
+    wishlist,
+)
+from .archive import archive_orders
+from .availability import BookingConflict
+from .cart import CacheCartStore, CartLine
+from .models import (
+    AccountProfile, ArchivedOrder, OrderItem, Brand, Category, CorporateProfile, IndividualProfile, Job, MediaBlob, Order,
+    OrderStatusChange, Product, ProductImageDerivative, ProductOccupancy, ProductPopularity, RentalFact, SavedCart,
+    StudioProfile, WishlistItem,
+)
+from .orders import InvalidTransition, bulk_transition, transition
+from .pagination import KeysetPaginator
+from .middleware import CompressionMiddleware
+from .profiles import resolve_profile
+from .search import search_products
+from .staticfiles import minify_css, rebase_urls
+from .uploads import store_upload
+from .popularity import rebuild_daily, refresh_windows, top_products
+from .views import CATALOG_ORDERINGS, in_group, place_cart_order
+
+
+_version_dir = tempfile.mkdtemp(prefix='rental-tests-')
+
+
+@override_settings(
+    CATALOG_VERSION_FILE=f'{_version_dir}/catalog',
+    AVAILABILITY_VERSION_FILE=f'{_version_dir}/availability',
+    WISHLIST_VERSION_DIR=f'{_version_dir}/wishlist',
+    ROLES_VERSION_DIR=f'{_version_dir}/roles',
+    MEDIA_ROOT=f'{_version_dir}/media',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    STORAGES={
+        'default': {'BACKEND': 'rental.storage.ContentAddressedStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class RentalTestCase(TestCase):
+    """Keeps version files and the cache from leaking between tests."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(_version_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Cameras')
+        self.brand = Brand.objects.create(name='Canon', logo='brands/canon.png')
+        self.user = User.objects.create_user('sara', 'sara@example.com', 'pw')
+
+    def product(self, name='Camera', price=100, units=1, **kwargs):
+        kwargs.setdefault('description', '')
+        kwargs.setdefault('image', 'products/x.png')
+        return Product.objects.create(
+            name=name, price=price, units=units,
+            brand=self.brand, category=self.category, **kwargs,
+        )
+
+    def place(self, lines, start=None, end=None, user=None, key=None):
+        """Check out ``(product, quantity)`` lines; returns ``(order, created)``."""
+        start = start or timezone.localdate() + timedelta(days=1)
+        end = end or start + timedelta(days=2)
+        cart = SimpleNamespace(lines=[CartLine(product, quantity, 1) for product, quantity in lines])
+        return place_cart_order(user or self.user, cart, start, end, idempotency_key=key)
+
+
+# --------------------------- Search ---------------------------
+
+class SearchTests(RentalTestCase):
+    def test_ranks_name_matches_first(self):
+        in_description = self.product('Tripod', description='Works with any canon body')
+        in_name = self.product('Canon EOS R5')
+        self.product('Drone')
+        results = list(search_products(Product.objects.all(), 'canon'))
+        self.assertEqual(results, [in_name, in_description])
+
+    def test_prefix_and_arabic_folding(self):
+        lens = self.product('عدسة كانون 50mm')
+        self.assertEqual(list(search_products(Product.objects.all(), 'عدسه 50')), [lens])
+
+    def test_punctuation_only_query_matches_nothing(self):
+        self.product('Canon')
+        for query in ['-', '!', '"*(']:
+            self.assertEqual(list(search_products(Product.objects.all(), query)), [])
+            response = self.client.get('/gallery/', {'search': query})
+            self.assertEqual(response.status_code, 200)
+
+    def test_relevance_pages_cover_every_match_once(self):
+        for i in range(7):
+            self.product(f'Canon {i}', description='canon ' * (i % 3))
+        self.product('Sony')
+        paginator = KeysetPaginator(search_products(Product.objects.all(), 'canon'), ('search_rank', 'id'), per_page=3)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen += [p.name for p in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sorted(seen), [f'Canon {i}' for i in range(7)])
+
+
+# --------------------------- Catalog paging ---------------------------
+
+class CatalogPagingTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        # Repeated prices and names so the id tiebreaker matters.
+        for i in range(11):
+            self.product(f'Item {i % 4}', price=10 * (i % 3))
+
+    def collect(self, params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            page = self.client.get('/gallery/', query).context['products']
+            ids += [p.id for p in page]
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_every_sort_pages_without_gaps_or_duplicates(self):
+        expected = sorted(Product.objects.values_list('id', flat=True))
+        for sort in CATALOG_ORDERINGS:
+            params = {'sort': sort}
+            if sort == 'relevance':
+                params['search'] = 'item'
+            with self.subTest(sort=sort), mock.patch('rental.views.CATALOG_PAGE_SIZE', 4):
+                self.assertEqual(sorted(self.collect(params)), expected)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get('/gallery/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 11)
+
+    def test_home_does_not_query_the_catalog_page(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            self.client.get('/', {'search': 'item'})
+
+
+# --------------------------- Catalog cache ---------------------------
+
+class CatalogCacheTests(RentalTestCase):
+    def test_version_bumps_only_when_the_write_commits(self):
+        before = catalog_cache.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product('Lens')
+            self.assertEqual(catalog_cache.current_version(), before)
+        self.assertGreater(catalog_cache.current_version(), before)
+
+    def test_cached_lists_follow_changes(self):
+        self.assertEqual([c.name for c in catalog_cache.get_categories()], ['Cameras'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Lights')
+        self.assertEqual(sorted(c.name for c in catalog_cache.get_categories()), ['Cameras', 'Lights'])
+
+
+# --------------------------- Best sellers ---------------------------
+
+class PopularityTests(RentalTestCase):
+    def test_orders_feed_the_ranking(self):
+        lens, camera = self.product('Lens'), self.product('Camera', units=5)
+        self.place([(lens, 1)])
+        self.place([(camera, 3)])
+        self.assertEqual(top_products(), [camera, lens])
+
+    def test_refresh_ages_orders_out_of_short_windows(self):
+        lens = self.product('Lens')
+        order, _ = self.place([(lens, 1)])
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=10))
+        rebuild_daily()
+        refresh_windows()
+        self.assertEqual(top_products(ProductPopularity.WINDOW_7D), [])
+        self.assertEqual(top_products(ProductPopularity.WINDOW_30D), [lens])
+
+    def test_rebuild_counts_archived_orders(self):
+        lens, gone = self.product('Lens'), self.product('Gone')
+        ArchivedOrder.objects.create(
+            id=999, user=self.user, created_at=timezone.now(), start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=2), total_price=10, status=Order.RETURNED,
+            items=[
+                {'product_id': lens.pk, 'product_name': 'Lens', 'quantity': 2, 'price': '5'},
+                {'product_id': gone.pk + 100, 'product_name': 'Deleted', 'quantity': 1, 'price': '5'},
+            ],
+        )
+        rebuild_daily()
+        refresh_windows()
+        self.assertEqual(top_products(), [lens])
+        self.assertEqual(ProductPopularity.objects.get(product=lens, window='all').rental_days, 4)
+
+    def test_windows_are_refreshed_by_the_job_worker(self):
+        self.assertIn('refresh_popularity', jobs._periodic)
+
+
+# --------------------------- Availability ---------------------------
+
+class OccupancyTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera = self.product('Camera', units=2)
+        self.start = timezone.localdate() + timedelta(days=3)
+        self.end = self.start + timedelta(days=2)
+
+    def occupancy(self):
+        return dict(ProductOccupancy.objects.filter(reserved__gt=0).values_list('day', 'reserved'))
+
+    def test_overbooking_is_rejected_and_rolled_back(self):
+        self.place([(self.camera, 2)], self.start, self.end)
+        with self.assertRaises(BookingConflict):
+            self.place([(self.camera, 1)], self.start + timedelta(days=1), self.end + timedelta(days=1))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(set(self.occupancy().values()), {2})
+
+    def test_return_day_is_free_for_the_next_rental(self):
+        self.place([(self.camera, 2)], self.start, self.end)
+        order, created = self.place([(self.camera, 2)], self.end, self.end + timedelta(days=1))
+        self.assertTrue(created)
+
+    def test_cancelling_releases_the_units(self):
+        order, _ = self.place([(self.camera, 2)], self.start, self.end)
+        transition(order, Order.CANCELLED)
+        self.assertEqual(self.occupancy(), {})
+        self.place([(self.camera, 2)], self.start, self.end)
+
+    def test_rebuild_matches_incremental_reservations(self):
+        self.place([(self.camera, 1)], self.start, self.end)
+        cancelled, _ = self.place([(self.camera, 1)], self.start, self.end)
+        transition(cancelled, Order.CANCELLED)
+        self.place([(self.camera, 1)], self.end, self.end + timedelta(days=3))
+        incremental = self.occupancy()
+        availability.rebuild()
+        self.assertEqual(self.occupancy(), incremental)
+
+
+class AvailabilityFilterTests(RentalTestCase):
+    def test_matrix_only_covers_days_it_holds(self):
+        today = timezone.localdate()
+        matrix = availability.FullDaysMatrix(today, 10, [])
+        self.assertTrue(matrix.covers(today + timedelta(days=8), today + timedelta(days=10)))
+        self.assertFalse(matrix.covers(today + timedelta(days=9), today + timedelta(days=11)))
+        self.assertFalse(matrix.covers(today + timedelta(days=10), today + timedelta(days=10)))
+
+    def test_fully_booked_day_past_the_horizon_is_filtered(self):
+        camera, lens = self.product('Camera'), self.product('Lens')
+        day = timezone.localdate() + timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place([(camera, 1)], day, day)
+        with self.settings(AVAILABILITY_HORIZON_DAYS=10):
+            available = availability.filter_available(Product.objects.all(), day, day)
+            self.assertEqual(list(available), [lens])
+
+
+# --------------------------- Wishlist ---------------------------
+
+class WishlistCacheTests(RentalTestCase):
+    def test_changes_reach_other_processes(self):
+        camera, lens = self.product('Camera'), self.product('Lens')
+        with self.captureOnCommitCallbacks(execute=True):
+            wishlist.add_many(self.user, [camera.id])
+        self.assertEqual(wishlist.wishlist_ids(self.user), {camera.id})
+
+        # Another worker changes the wishlist; this process keeps its cached entry
+        # but sees the version bump in the shared store.
+        with mock.patch('rental.wishlist.get_cache'), self.captureOnCommitCallbacks(execute=True):
+            wishlist.add_many(self.user, [lens.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(wishlist.wishlist_ids(self.user), {camera.id, lens.id})
+        with self.assertNumQueries(0):
+            wishlist.wishlist_ids(self.user)
+
+    def test_version_bumps_only_when_the_write_commits(self):
+        camera = self.product('Camera')
+        before = wishlist.get_version_store(self.user.id).get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            wishlist.add_many(self.user, [camera.id])
+        self.assertEqual(wishlist.get_version_store(self.user.id).get(), before)
+        callbacks[0]()
+        self.assertEqual(wishlist.get_version_store(self.user.id).get(), before + 1)
+
+
+class WishlistBulkTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera, self.lens, self.tripod = self.product('Camera'), self.product('Lens'), self.product('Tripod')
+        self.other = User.objects.create_user('omar')
+        WishlistItem.objects.create(user=self.other, product=self.camera)
+        self.client.force_login(self.user)
+
+    def post(self, action, *ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/wishlist/{action}/', {'product_ids': [str(i) for i in ids]}, HTTP_ACCEPT='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def rows(self, user):
+        return sorted(WishlistItem.objects.filter(user=user).values_list('product_id', flat=True))
+
+    def test_add_many_skips_duplicates_and_unknown_ids(self):
+        self.assertEqual(wishlist.add_many(self.user, [self.camera.id, self.camera.id, 999999]), 1)
+        self.assertEqual(wishlist.add_many(self.user, [self.camera.id, self.lens.id]), 1)
+        self.assertEqual(self.rows(self.user), [self.camera.id, self.lens.id])
+        self.assertEqual(self.rows(self.other), [self.camera.id])
+
+    def test_bulk_add(self):
+        data = self.post('bulk-add', self.camera.id, self.camera.id, self.lens.id, 999999, 'junk')
+        self.assertEqual(data, {'added': 2, 'wishlist': [self.camera.id, self.lens.id]})
+        data = self.post('bulk-add', self.lens.id, self.tripod.id)
+        self.assertEqual(data, {'added': 1, 'wishlist': [self.camera.id, self.lens.id, self.tripod.id]})
+        self.assertEqual(self.rows(self.other), [self.camera.id])
+
+    def test_bulk_remove_only_touches_own_rows(self):
+        wishlist.add_many(self.user, [self.camera.id, self.lens.id])
+        data = self.post('bulk-remove', self.camera.id, self.camera.id, 999999)
+        self.assertEqual(data, {'removed': 1, 'wishlist': [self.lens.id]})
+        self.assertEqual(self.rows(self.other), [self.camera.id])
+        self.assertEqual(self.post('bulk-remove', self.tripod.id), {'removed': 0, 'wishlist': [self.lens.id]})
+
+    def test_bulk_add_redirects_without_json(self):
+        response = self.client.post('/wishlist/bulk-add/', {'product_ids': f'{self.camera.id},{self.lens.id}'})
+        self.assertRedirects(response, '/wishlist/', fetch_redirect_response=False)
+        self.assertEqual(self.rows(self.user), [self.camera.id, self.lens.id])
+
+    def test_bulk_endpoints_require_login_and_post(self):
+        self.assertEqual(self.client.get('/wishlist/bulk-add/').status_code, 405)
+        self.client.logout()
+        response = self.client.post('/wishlist/bulk-add/', {'product_ids': [self.lens.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rows(self.user), [])
+
+
+# --------------------------- Registration ---------------------------
+
+def png(name='id.png', size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class RegistrationTests(RentalTestCase):
+    COMMON = {
+        'password1': 'a-Long-pass-123', 'password2': 'a-Long-pass-123', 'agree_terms': 'on',
+        'hear_about': 'friend', 'governorate': 'Cairo', 'profile_link': 'https://example.com/me',
+        'phone': '0100', 'whatsapp': '0101',
+    }
+
+    def register(self, account_type, **data):
+        data = {**self.COMMON, 'username': account_type, 'email': f'{account_type}@example.com', **data}
+        response = self.client.post(f'/register/?type={account_type}', data)
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        return User.objects.get(username=account_type)
+
+    def test_individual(self):
+        user = self.register(
+            'individual', full_name='Mona', date_of_birth='1990-01-01', city='Cairo', street='Tahrir',
+            building='1', floor='2', apartment='3', professional_category='Photographer',
+            portfolio_link='https://example.com/work', id_front=png(), id_rear=png(), other_id=png(),
+        )
+        profile = IndividualProfile.objects.get(user=user)
+        self.assertEqual((profile.mobile_phone, profile.whatsapp_number), ('0100', '0101'))
+        self.assertTrue(default_storage.exists(profile.id_front.name))
+
+    def test_corporate(self):
+        user = self.register(
+            'corporate', company_name='Acme', company_address='Nile St', company_phone='0200',
+            company_social='https://example.com/acme', ceo_name='Ali', ceo_phone='0201', ceo_email='ceo@example.com',
+            ceo_id_front=png(), ceo_id_rear=png(), auth_name='Hoda', auth_phone='0202', auth_email='a@example.com',
+            auth_id_front=png(), auth_id_rear=png(), tax_card=png(), commercial_reg=png(),
+        )
+        profile = CorporateProfile.objects.get(user=user)
+        self.assertEqual((profile.authorized_name, profile.mobile_phone), ('Hoda', '0200'))
+        self.assertTrue(default_storage.exists(profile.commercial_registration.name))
+
+    def test_studio(self):
+        user = self.register('studio', studio_name='Lights', id_front=png(), id_rear=png())
+        profile = StudioProfile.objects.get(user=user)
+        self.assertEqual((profile.studio_name, profile.governorate), ('Lights', 'Cairo'))
+        self.assertTrue(default_storage.exists(profile.id_rear.name))
+
+    @override_settings(REGISTRATION_IMAGE_MAX_SIDE=100)
+    def test_large_images_are_downscaled_in_the_background(self):
+        user = self.register('studio', studio_name='Lights', id_front=png(size=(400, 100)), id_rear=png())
+        profile = StudioProfile.objects.get(user=user)
+        original = profile.id_front.name
+        self.assertEqual(Image.open(default_storage.open(original)).size, (400, 100))
+
+        queued = Job.objects.filter(name='downscale_upload')
+        self.assertEqual(sorted(job.payload['field'] for job in queued), ['id_front', 'id_rear'])
+        for job in queued:
+            tasks.downscale_upload(**job.payload)
+
+        profile.refresh_from_db()
+        self.assertNotEqual(profile.id_front.name, original)
+        self.assertTrue(profile.id_front.name.startswith('ids/studio/'))
+        with default_storage.open(profile.id_front.name) as f:
+            data = f.read()
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (100, 25))
+        self.assertIn(hashlib.sha256(data).hexdigest(), profile.id_front.name)
+        # The original stays until collect_media finds it unreferenced
+        self.assertTrue(default_storage.exists(original))
+
+    @override_settings(REGISTRATION_IMAGE_MAX_SIDE=100)
+    def test_downscale_leaves_a_replaced_file_alone(self):
+        user = self.register('studio', studio_name='Lights', id_front=png(size=(400, 100)), id_rear=png())
+        job = Job.objects.get(name='downscale_upload', payload__field='id_front')
+        StudioProfile.objects.filter(user=user).update(id_front='ids/studio/new.png')
+        tasks.downscale_upload(**job.payload)
+        self.assertEqual(StudioProfile.objects.get(user=user).id_front.name, 'ids/studio/new.png')
+
+
+# --------------------------- Roles ---------------------------
+
+class RoleTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = Group.objects.create(name='staff')
+        self.session = SessionStore()
+
+    def roles(self):
+        request = RequestFactory().get('/')
+        request.user, request.session = self.user, self.session
+        return roles.get_roles(request)
+
+    def test_group_checks_load_roles_once_per_session(self):
+        view = in_group('staff')(lambda request: HttpResponse('ok'))
+
+        def get():
+            request = RequestFactory().get('/dashboard/')
+            request.user, request.session = self.user, self.session
+            return view(request)
+
+        self.assertEqual(get().status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get().status_code, 200)
+        self.assertTrue(any('auth_user_groups' in q['sql'] for q in queries))
+        with self.assertNumQueries(0):
+            self.assertEqual(get().status_code, 200)
+
+    def test_group_changes_reach_existing_sessions(self):
+        self.assertNotIn('staff', self.roles())
+        with self.assertNumQueries(0):
+            self.roles()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.staff)
+        self.assertIn('staff', self.roles())
+
+    def test_versions_survive_a_cache_reset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.staff)
+        self.assertIn('staff', self.roles())
+        cache.clear()  # e.g. a restart with a per-process cache
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.staff)
+        self.assertNotIn('staff', self.roles())
+
+    def test_version_bumps_only_when_the_change_commits(self):
+        self.roles()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.add(self.staff)
+        self.assertNotIn('staff', self.roles())
+        for callback in callbacks:
+            callback()
+        self.assertIn('staff', self.roles())
+
+
+# --------------------------- Image derivatives ---------------------------
+
+@override_settings(PRODUCT_IMAGE_WIDTHS=(160,))
+class ImageDerivativeTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = store_upload(png(size=(320, 200)), 'products/')
+
+    def test_render_writes_nothing(self):
+        camera = self.product(image=self.source)
+        blobs = MediaBlob.objects.count()
+        with self.assertNumQueries(0), mock.patch.object(default_storage, 'save') as save:
+            rows, info = images.render(self.source)
+        save.assert_not_called()
+        self.assertEqual((info['image_width'], info['image_height']), (320, 200))
+
+        images.save_derivatives(camera.id, self.source, rows, info)
+        derivatives = list(ProductImageDerivative.objects.filter(product=camera))
+        self.assertEqual(len(derivatives), len(rows))
+        self.assertEqual(MediaBlob.objects.count(), blobs + len({d.file for d in derivatives}))
+        self.assertTrue(all(default_storage.exists(d.file) for d in derivatives))
+
+    def test_late_render_of_an_old_image_is_dropped(self):
+        camera = self.product(image=self.source)
+        old = images.render(self.source)
+        new_source = store_upload(png(size=(200, 200)), 'products/')
+        Product.objects.filter(pk=camera.pk).update(image=new_source)
+        self.assertTrue(images.build_derivatives(camera.id))
+        current = sorted(ProductImageDerivative.objects.filter(product=camera).values_list('file', flat=True))
+
+        self.assertFalse(images.save_derivatives(camera.id, self.source, *old))
+        self.assertEqual(
+            sorted(ProductImageDerivative.objects.filter(product=camera).values_list('file', flat=True)), current,
+        )
+        self.assertEqual(Product.objects.get(pk=camera.pk).image_width, 200)
+        self.assertTrue(all(default_storage.exists(name) for name in current))
+
+    def test_identical_derivatives_are_stored_once(self):
+        camera, copy = self.product('Camera', image=self.source), self.product('Copy', image=self.source)
+        images.build_derivatives(camera.id)
+        images.build_derivatives(copy.id)
+        files = ProductImageDerivative.objects.values_list('file', flat=True)
+        self.assertEqual(set(files.filter(product=camera)), set(files.filter(product=copy)))
+        self.assertTrue(all(name.startswith(f'{images.DERIVATIVE_DIR}/') for name in files))
+
+
+# --------------------------- Compression ---------------------------
+
+class CompressionTests(RentalTestCase):
+    BODY = b'<p>' + b'Canon EOS R5 ' * 100 + b'</p>'
+
+    def get(self, user=None, response=None, **meta):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip', **meta)
+        request.user = user or AnonymousUser()
+        middleware = CompressionMiddleware(lambda request: response or HttpResponse(self.BODY))
+        return middleware(request)
+
+    @staticmethod
+    def gzip_name(data):
+        """The file name field of a gzip header, which carries the padding."""
+        if not data[3] & gzip.FNAME:
+            return b''
+        return data[10:data.index(b'\0', 10)]
+
+    def test_anonymous_pages_are_cached_unpadded(self):
+        first, second = self.get(), self.get()
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.gzip_name(first.content), b'')
+        self.assertEqual(gzip.decompress(first.content), self.BODY)
+
+    @mock.patch('rental.middleware.secrets.randbelow', return_value=37)
+    def test_pages_for_signed_in_users_are_padded(self, randbelow):
+        response = self.get(user=self.user)
+        self.assertEqual(self.gzip_name(response.content), b'a' * 37)
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    @mock.patch('rental.middleware.secrets.randbelow', return_value=12)
+    def test_pages_with_a_csrf_token_are_padded(self, randbelow):
+        response = self.get(CSRF_COOKIE_NEEDS_UPDATE=True)
+        self.assertEqual(self.gzip_name(response.content), b'a' * 12)
+
+    @mock.patch('rental.middleware.secrets.randbelow', return_value=5)
+    def test_padded_streams_decompress(self, randbelow):
+        chunks = [self.BODY, b'more', self.BODY]
+        response = self.get(user=self.user, response=StreamingHttpResponse(iter(chunks), content_type='text/html'))
+        data = b''.join(response.streaming_content)
+        self.assertEqual(self.gzip_name(data), b'a' * 5)
+        self.assertEqual(gzip.decompress(data), b''.join(chunks))
+
+
+# --------------------------- Media storage ---------------------------
+
+class MediaStorageTests(RentalTestCase):
+    def age(self, name, days=2):
+        past = timezone.now() - timedelta(days=days)
+        MediaBlob.objects.filter(name=name).update(created_at=past, touched_at=past)
+
+    def test_reusing_an_orphan_restarts_its_grace_period(self):
+        name = store_upload(png(), 'ids/test/')
+        self.age(name)
+        self.assertEqual(store_upload(png(), 'ids/test/'), name)
+        self.assertEqual(storage.collect(), [])
+        self.assertTrue(default_storage.exists(name))
+
+        self.age(name)
+        self.assertEqual(storage.collect(), [name])
+        self.assertFalse(default_storage.exists(name))
+
+    def test_adopt_repoints_rows_and_invalidates_cached_pages(self):
+        legacy = 'products/legacy.png'
+        path = default_storage.path(legacy)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(png().read())
+        camera = self.product(image=legacy)
+        version = catalog_cache.current_version()
+
+        self.assertEqual(storage.adopt(), 1)
+        camera.refresh_from_db()
+        self.assertTrue(storage.is_content_addressed(camera.image.name))
+        self.assertTrue(default_storage.exists(camera.image.name))
+        self.assertFalse(os.path.exists(path))
+        self.assertGreater(catalog_cache.current_version(), version)
+
+
+# --------------------------- Exports ---------------------------
+
+class ExportTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera, self.lens = self.product('Camera', price=50, units=5), self.product('Lens', price=20, units=5)
+        self.old = self.place([(self.camera, 2)])[0]
+        self.new = self.place([(self.lens, 1)])[0]
+        self.today = timezone.localdate()
+        Order.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.staff = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def export(self, name='orders', **params):
+        response = self.client.get(f'/exports/{name}/', params)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_rows(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], list(exports.EXPORTS['orders'][1]))
+        self.assertEqual(
+            [(row[0], row[3], row[12], row[13], row[14]) for row in rows[1:]],
+            [(str(self.old.id), 'sara', 'Camera', '2', '50.00'), (str(self.new.id), 'sara', 'Lens', '1', '20.00')],
+        )
+
+    def test_jsonl_rows(self):
+        response, body = self.export('products', format='jsonl')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([(row['id'], row['name'], row['price']) for row in rows], [
+            (self.camera.id, 'Camera', '50.00'), (self.lens.id, 'Lens', '20.00'),
+        ])
+
+    def test_date_filters(self):
+        def order_ids(**params):
+            body = self.export(format='jsonl', **params)[1]
+            return [json.loads(line)['order_id'] for line in body.decode().splitlines()]
+
+        self.assertEqual(order_ids(start=self.today.isoformat()), [self.new.id])
+        self.assertEqual(order_ids(end=(self.today - timedelta(days=1)).isoformat()), [self.old.id])
+        both = order_ids(start=(self.today - timedelta(days=10)).isoformat(), end=self.today.isoformat())
+        self.assertEqual(both, [self.old.id, self.new.id])
+        self.assertEqual(self.client.get('/exports/orders/', {'start': 'May 1'}).status_code, 400)
+
+    def test_gzip_matches_the_plain_export(self):
+        response, body = self.export(gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(body), self.export()[1])
+
+    def test_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/exports/orders/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+        self.client.logout()
+        self.assertEqual(self.client.get('/exports/orders/').status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/exports/unknown/').status_code, 404)
+
+
+# --------------------------- Wishlist notifications ---------------------------
+
+class WishlistDigestTests(RentalTestCase):
+    def test_one_digest_per_watcher_covers_every_event(self):
+        camera, lens, tripod = self.product('Camera', price=100), self.product('Lens', price=80), self.product('Tripod')
+        wishlist.add_many(self.user, [camera.id, lens.id, tripod.id])
+        other = User.objects.create_user('omar', 'omar@example.com', 'pw')
+        wishlist.add_many(other, [lens.id])
+
+        changes = [(camera, 'price', 90), (camera, 'price', 70), (lens, 'price', 60), (tripod, 'units', 3)]
+        for product, field, value in changes:
+            setattr(product, field, value)
+            product.save()
+
+        self.assertEqual(notifications.fan_out(), 2)
+        digests = {job.payload['user_id']: job.payload for job in Job.objects.filter(name='wishlist_digest')}
+        events = {(event['product_name'], event['kind']) for event in digests[self.user.id]['events']}
+        self.assertEqual(events, {('Camera', 'price_drop'), ('Lens', 'price_drop'), ('Tripod', 'available')})
+        camera_drop = next(e for e in digests[self.user.id]['events'] if e['product_name'] == 'Camera')
+        self.assertEqual((camera_drop['old_price'], camera_drop['price']), ('100.00', '70.00'))
+        self.assertEqual([event['product_name'] for event in digests[other.id]['events']], ['Lens'])
+
+        # Already processed: a second run sends nothing new
+        self.assertEqual(notifications.fan_out(), 0)
+        self.assertEqual(Job.objects.filter(name='wishlist_digest').count(), 2)
+
+        tasks.wishlist_digest(**digests[self.user.id])
+        self.assertEqual(mail.outbox[0].to, ['sara@example.com'])
+        self.assertIn('Camera is now EGP 70.00/day (was EGP 100.00)', mail.outbox[0].body)
+
+
+# --------------------------- Order history ---------------------------
+
+@mock.patch('rental.views.ORDER_HISTORY_PAGE_SIZE', 3)
+class OrderHistoryTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        camera = self.product(units=10)
+        now = timezone.now()
+        self.expected = []
+        for i in range(4):
+            order = self.place([(camera, 1)])[0]
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=i))
+            self.expected.append(order.id)
+        for i in range(2):
+            archived = ArchivedOrder.objects.create(
+                id=1000 + i, user=self.user, created_at=now - timedelta(days=10 + i),
+                start_date=timezone.localdate(), end_date=timezone.localdate(), total_price=10,
+                status=Order.RETURNED, items=[],
+            )
+            self.expected.append(archived.id)
+        # Someone else's orders never show up
+        self.place([(camera, 1)], user=User.objects.create_user('omar', 'omar@example.com', 'pw'))
+        self.client.force_login(self.user)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/my_orders/', {'format': 'json', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_pages_walk_hot_and_archived_orders_with_constant_queries(self):
+        first, queries = self.get()
+        with self.assertNumQueries(queries):
+            second, _ = self.get(cursor=first['next_cursor'])
+        self.assertEqual([o['id'] for o in first['orders'] + second['orders']], self.expected)
+        self.assertEqual([o['archived'] for o in second['orders']], [False, True, True])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        first, _ = self.get()
+        tampered, _ = self.get(cursor=first['next_cursor'][:-2] + 'xx')
+        self.assertEqual(tampered, first)
+
+    def test_html_page(self):
+        response = self.client.get('/my_orders/')
+        self.assertEqual([order.id for order in response.context['orders']], self.expected[:3])
+
+
+# --------------------------- Analytics ---------------------------
+
+class AnalyticsTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera = self.product('Camera', price=50, units=4)
+        self.start = timezone.localdate() + timedelta(days=1)
+        day = timedelta(days=1)
+        # Overlapping rentals: 2 units for two days, then 1 unit from the second day
+        self.first = self.place([(self.camera, 2)], self.start, self.start + 2 * day)[0]
+        self.second = self.place([(self.camera, 1)], self.start + day, self.start + 3 * day)[0]
+
+    def settle(self, *orders):
+        Order.objects.filter(pk__in=[o.pk for o in orders]).update(
+            created_at=timezone.now() - analytics.SETTLE_DELAY - timedelta(seconds=1),
+        )
+
+    def facts(self):
+        return {
+            (fact.day - self.start).days: (fact.unit_days, fact.revenue)
+            for fact in RentalFact.objects.filter(product=self.camera, unit_days__gt=0)
+        }
+
+    def test_rollup_sums_overlapping_orders_once_settled(self):
+        self.settle(self.first)
+        self.assertEqual(analytics.rollup_new_orders(), 1)
+        self.assertEqual(self.facts(), {0: (2, Decimal('100')), 1: (2, Decimal('100'))})
+
+        # The second order is too fresh: the high-water mark stays before it
+        self.assertEqual(analytics.rollup_new_orders(), 0)
+        self.settle(self.second)
+        self.assertEqual(analytics.rollup_new_orders(), 1)
+        self.assertEqual(analytics.rollup_new_orders(), 0)
+        self.assertEqual(self.facts(), {0: (2, Decimal('100')), 1: (3, Decimal('150')), 2: (1, Decimal('50'))})
+
+    def test_cancelling_a_rolled_up_order_retracts_its_facts(self):
+        self.settle(self.first, self.second)
+        analytics.rollup_new_orders()
+        transition(self.second, Order.CANCELLED)
+        job = Job.objects.get(name='retract_rollups')
+        self.assertEqual(job.payload['order_ids'], [self.second.id])
+        tasks.retract_rollups(**job.payload)
+        self.assertEqual(self.facts(), {0: (2, Decimal('100')), 1: (2, Decimal('100'))})
+
+    def test_report_view(self):
+        self.settle(self.first, self.second)
+        analytics.rollup_new_orders()
+        self.assertEqual(self.client.get('/reports/').status_code, 302)
+        self.client.force_login(User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True))
+        response = self.client.get('/reports/', {
+            'group': 'product', 'period': 'month',
+            'start': self.start.isoformat(), 'end': (self.start + timedelta(days=2)).isoformat(),
+        })
+        rows = response.context['rows']
+        self.assertEqual(sum(row['revenue'] for row in rows), Decimal('300'))
+        self.assertEqual(sum(row['unit_days'] for row in rows), 6)
+        self.assertEqual({row['label'] for row in rows}, {'Camera'})
+
+
+# --------------------------- Static files ---------------------------
+
+class StaticFilesTests(RentalTestCase):
+    def test_minify_strips_comments_and_whitespace(self):
+        css = """
+            /* header */
+            .a  >  .b {
+                color: red ;
+                margin: 0 auto;
+            }
+        """
+        self.assertEqual(minify_css(css), '.a>.b{color:red;margin:0 auto}')
+
+    def test_minify_keeps_strings_and_urls(self):
+        css = '.a { content: "/* not a comment */  x"; background: url( "img/a b.png" ) ; }'
+        self.assertEqual(minify_css(css), '.a{content:"/* not a comment */  x";background:url( "img/a b.png" )}')
+
+    def test_bundled_urls_are_rebased(self):
+        css = '.a{background:url(../img/x.png)}.b{background:url(/abs.png)}.c{background:url(data:x)}'
+        self.assertEqual(
+            rebase_urls(css, 'rental/css/pages/cart.css', 'rental/css/bundles/site/cart.css'),
+            '.a{background:url(../../img/x.png)}.b{background:url(/abs.png)}.c{background:url(data:x)}',
+        )
+
+    def test_collectstatic_writes_hashed_bundles_with_gzip_siblings(self):
+        root = tempfile.mkdtemp(prefix='rental-static-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with override_settings(
+            STATIC_ROOT=f'{root}/collected',
+            STATIC_BUNDLES_ROOT=f'{root}/bundles',
+            STORAGES={
+                'default': {'BACKEND': 'rental.storage.ContentAddressedStorage'},
+                'staticfiles': {'BACKEND': 'rental.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(f'{root}/collected/staticfiles.json') as f:
+            hashed = json.load(f)['paths']['rental/css/bundles/site.css']
+        self.assertRegex(hashed, r'^rental/css/bundles/site\.[0-9a-f]{12}\.css$')
+        with open(f'{root}/collected/{hashed}', 'rb') as f:
+            bundle = f.read()
+        with open(f'{root}/collected/{hashed}.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), bundle)
+        self.assertNotIn(b'/*', bundle)
+
+
+# --------------------------- Account profiles ---------------------------
+
+class AccountProfileTests(RentalTestCase):
+    ADDRESS = {
+        'mobile_phone': '0100', 'whatsapp_number': '0101', 'profile_link': 'https://example.com/me',
+        'hear_about': 'friend', 'governorate': 'Cairo', 'city': 'Giza', 'street': 'Tahrir',
+        'building': '1', 'floor': '2', 'apartment': '',
+    }
+
+    def individual(self, user=None, **kwargs):
+        return IndividualProfile.objects.create(
+            user=user or self.user, full_name='Mona', date_of_birth='1990-01-01',
+            professional_category='Photographer', portfolio_link='https://example.com/work',
+            **{**self.ADDRESS, **kwargs},
+        )
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_each_profile_type_upserts_the_account_profile(self):
+        profile = self.individual()
+        account = AccountProfile.objects.get(user=self.user)
+        self.assertEqual(
+            (account.profile_type, account.display_name, account.phone, account.address, account.city),
+            (AccountProfile.INDIVIDUAL, 'Mona', '0100', 'Tahrir, Building 1, Floor 2', 'Giza'),
+        )
+        profile.full_name = 'Mona A.'
+        profile.save()
+        self.assertEqual(AccountProfile.objects.get(user=self.user).display_name, 'Mona A.')
+
+        boss = User.objects.create_user('boss')
+        CorporateProfile.objects.create(
+            user=boss, company_name='Acme', company_address='Nile St', company_social='https://example.com/acme',
+            ceo_name='Ali', ceo_phone='0201', ceo_email='ceo@example.com', authorized_name='Hoda',
+            authorized_phone='0202', authorized_email='a@example.com', **self.ADDRESS,
+        )
+        owner = User.objects.create_user('owner')
+        StudioProfile.objects.create(user=owner, studio_name='Lights', phone='0300', whatsapp='0301')
+        self.assertEqual(
+            sorted(AccountProfile.objects.exclude(user=self.user).values_list('profile_type', 'display_name', 'phone', 'address')),
+            [(AccountProfile.CORPORATE, 'Acme', '0100', 'Nile St'), (AccountProfile.STUDIO, 'Lights', '0300', '')],
+        )
+
+    def test_resolve_profile_joins_the_full_profile_in_one_query(self):
+        self.individual()
+        request = self.request(self.user)
+        with self.assertNumQueries(1):
+            account = resolve_profile(request)
+            self.assertEqual(account.profile.full_name, 'Mona')
+        with self.assertNumQueries(0):
+            self.assertIs(resolve_profile(request), account)
+
+    def test_resolve_profile_without_a_profile(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_profile(self.request(AnonymousUser())))
+        self.assertIsNone(resolve_profile(self.request(self.user)))
+
+    def test_checkout_is_prefilled_from_the_account_profile(self):
+        self.individual()
+        camera = self.product('Camera', price=50)
+        self.client.force_login(self.user)
+        self.client.post(f'/add-to-cart/{camera.pk}/')
+        response = self.client.get('/checkout/')
+        self.assertEqual(response.context['account_profile'].display_name, 'Mona')
+        self.assertContains(response, 'name="full_name" value="Mona"')
+        self.assertContains(response, 'name="address" value="Tahrir, Building 1, Floor 2"')
+        self.assertContains(response, 'name="city" value="Giza"')
+
+
+# --------------------------- Order transitions ---------------------------
+
+class OrderTransitionTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera = self.product(units=10)
+
+    def test_illegal_transitions_are_rejected(self):
+        order, _ = self.place([(self.camera, 1)])
+        with self.assertRaises(InvalidTransition):
+            transition(order, Order.RETURNED)
+        transition(order, Order.CANCELLED)
+        with self.assertRaises(InvalidTransition):
+            transition(order, Order.CONFIRMED)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.CANCELLED)
+        self.assertEqual(OrderStatusChange.objects.filter(order=order).count(), 1)
+
+    def test_bulk_skips_orders_that_cannot_make_the_move(self):
+        pending, _ = self.place([(self.camera, 1)])
+        returned, _ = self.place([(self.camera, 1)])
+        Order.objects.filter(pk=returned.pk).update(status=Order.RETURNED)
+        self.assertEqual(bulk_transition(Order.objects.all(), Order.CONFIRMED), 1)
+        self.assertEqual(list(OrderStatusChange.objects.values_list('order_id', flat=True)), [pending.id])
+        self.assertEqual(Order.objects.get(pk=returned.pk).status, Order.RETURNED)
+
+    def test_rows_moved_concurrently_get_no_side_effects(self):
+        first, _ = self.place([(self.camera, 1)])
+        second, _ = self.place([(self.camera, 1)])
+        Job.objects.all().delete()
+        real_update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if kwargs.get('status') == Order.CANCELLED:
+                # Another request confirms the second order between the SELECT and the UPDATE
+                real_update(Order.objects.filter(pk=second.pk), status=Order.CONFIRMED)
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            changed = bulk_transition(Order.objects.filter(status=Order.PENDING), Order.CANCELLED)
+        self.assertEqual(changed, 1)
+        self.assertEqual(list(OrderStatusChange.objects.values_list('order_id', flat=True)), [first.id])
+        self.assertEqual(
+            [job.payload['order_id'] for job in Job.objects.filter(name='order_status_changed')], [first.id],
+        )
+        # Only the cancelled order's units are released
+        self.assertEqual(set(ProductOccupancy.objects.values_list('reserved', flat=True)), {1})
+
+
+# --------------------------- Archive ---------------------------
+
+class ArchiveTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera = self.product(units=10)
+
+    def closed_order(self, status=Order.RETURNED, quantity=1):
+        """An order that ended three years ago and was placed long before the rollup settle delay."""
+        order, _ = self.place([(self.camera, quantity)])
+        start = timezone.localdate() - timedelta(days=3 * 365)
+        Order.objects.filter(pk=order.pk).update(
+            status=status, start_date=start, end_date=start + timedelta(days=2),
+            created_at=timezone.now() - timedelta(days=3 * 365),
+        )
+        return order
+
+    def facts(self):
+        facts = RentalFact.objects.filter(unit_days__gt=0)
+        return sorted(facts.values_list('day', 'product_id', 'unit_days', 'revenue'))
+
+    def test_orders_with_queued_jobs_are_archived_later(self):
+        queued, done = self.closed_order(), self.closed_order()
+        Job.objects.filter(payload__order_id=done.id).update(status=Job.DONE)
+        self.assertEqual(archive_orders(batch_size=1), 1)
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [done.id])
+        self.assertTrue(Order.objects.filter(pk=queued.pk).exists())
+
+        Job.objects.update(status=Job.DONE)
+        self.assertEqual(archive_orders(), 1)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_tasks_skip_a_missing_order(self):
+        tasks.order_placed(order_id=12345)
+        tasks.order_status_changed(order_id=12345, old_status=Order.PENDING, new_status=Order.CONFIRMED)
+        self.assertEqual(mail.outbox, [])
+
+    def test_export_keeps_archived_orders(self):
+        archived, live = self.closed_order(quantity=2), self.place([(self.camera, 1)])[0]
+        Job.objects.update(status=Job.DONE)
+        self.assertEqual(archive_orders(), 1)
+        rows = list(csv.DictReader(io.StringIO(b''.join(exports.stream_export('orders')).decode())))
+        self.assertEqual([int(row['order_id']) for row in rows], [live.id, archived.id])
+        self.assertEqual(
+            (rows[1]['product__name'], rows[1]['quantity'], rows[1]['price'], rows[1]['id']),
+            (self.camera.name, '2', '100.00', ''),
+        )
+
+    def test_analytics_rebuild_keeps_archived_orders(self):
+        self.closed_order(quantity=2)
+        self.closed_order(status=Order.CANCELLED)
+        analytics.rollup_new_orders()
+        before = self.facts()
+        self.assertTrue(before)
+
+        Job.objects.update(status=Job.DONE)
+        self.assertEqual(archive_orders(), 2)
+        self.assertEqual(analytics.rebuild(), 1)
+        self.assertEqual(self.facts(), before)
+
+
+# --------------------------- Cart stores ---------------------------
+
+class CartStoreTests(RentalTestCase):
+    def cart_ids(self):
+        return [line.product.id for line in self.client.get('/cart/').context['cart_items']]
+
+    def test_signed_cookie_round_trip(self):
+        camera, lens = self.product('Camera'), self.product('Lens')
+        self.client.get(f'/add-to-cart/{camera.id}/')
+        self.client.post(f'/update-cart/{camera.id}/', {'quantity': 3})
+        self.client.get(f'/add-to-cart/{lens.id}/')
+        self.assertIn('cart', self.client.cookies)
+        lines = {line.product.id: line.quantity for line in self.client.get('/cart/').context['cart_items']}
+        self.assertEqual(lines, {camera.id: 3, lens.id: 1})
+
+    @override_settings(CART_STORE='rental.cart.SessionCartStore')
+    def test_session_round_trip(self):
+        camera = self.product('Camera')
+        self.client.get(f'/add-to-cart/{camera.id}/')
+        self.assertNotIn('cart', self.client.cookies)
+        self.assertEqual(self.cart_ids(), [camera.id])
+
+    @override_settings(CART_STORE='rental.cart.CacheCartStore')
+    def test_cache_round_trip_and_flush(self):
+        camera = self.product('Camera')
+        self.client.get(f'/add-to-cart/{camera.id}/')
+        self.assertEqual(self.cart_ids(), [camera.id])
+        self.assertEqual(CacheCartStore.flush(), 1)
+        self.assertEqual(SavedCart.objects.get().data['items'], {str(camera.id): [1, 1]})
+
+    def test_logout_drops_the_cart(self):
+        camera = self.product('Camera')
+        self.client.login(username='sara', password='pw')
+        self.client.get(f'/add-to-cart/{camera.id}/')
+        response = self.client.get('/logout/')
+        self.assertEqual(response.cookies['cart'].value, '')
+        self.assertEqual(self.cart_ids(), [])
+
+    def test_cookie_cart_is_capped(self):
+        camera, lens = self.product('Camera'), self.product('Lens')
+        with mock.patch('rental.cart.COOKIE_MAX_BYTES', 100):
+            self.client.get(f'/add-to-cart/{camera.id}/')
+            response = self.client.get(f'/add-to-cart/{lens.id}/', follow=True)
+        self.assertIn('cart is full', str(list(response.context['messages'])[-1]))
+        self.assertEqual(self.cart_ids(), [camera.id])
+
+    def test_cache_store_rejects_a_per_process_cache(self):
+        with override_settings(CART_STORE='rental.cart.CacheCartStore'):
+            self.assertEqual([e.id for e in checks.check_cart_store(None)], ['rental.E001'])
+        self.assertEqual(checks.check_cart_store(None), [])
+
+
+# --------------------------- Checkout ---------------------------
+
+class CheckoutTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.camera = self.product('Camera', price=50)
+        self.client.force_login(self.user)
+        self.start = timezone.localdate() + timedelta(days=1)
+
+    def submit(self, key='key-1', start=None, end=None):
+        start = start or self.start
+        self.client.post(f'/add-to-cart/{self.camera.pk}/')
+        return self.client.post('/checkout/', {
+            'start_date': start.isoformat(),
+            'end_date': (end or start + timedelta(days=2)).isoformat(),
+            'delivery_option': 'pickup',
+            'idempotency_key': key,
+        })
+
+    def test_rejects_past_and_reversed_dates(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        for key, start, end in [('past', yesterday, self.start), ('reversed', self.start, yesterday)]:
+            response = self.submit(key, start=start, end=end)
+            self.assertRedirects(response, '/checkout/', fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(len(self.client.get('/cart/').context['cart_items']), 1)
+
+    def test_places_the_order_and_clears_the_cart(self):
+        response = self.submit()
+        self.assertRedirects(response, '/my_orders/', fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual((order.total_price, order.item_count, order.first_product_name), (100, 1, 'Camera'))
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.camera.pk, 1)])
+        self.assertEqual(len(self.client.get('/cart/').context['cart_items']), 0)
+
+    def test_replayed_submission_creates_one_order(self):
+        self.submit()
+        self.submit()
+        self.assertEqual(Order.objects.count(), 1)
+        order, created = self.place([(self.camera, 1)], key='key-1')
+        self.assertFalse(created)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_conflict_is_reported_without_an_order(self):
+        self.place([(self.camera, 1)], self.start, self.start + timedelta(days=2), user=User.objects.create_user('x'))
+        response = self.submit()
+        self.assertRedirects(response, '/checkout/', fetch_redirect_response=False)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 0)
+
+    def test_unrelated_integrity_errors_are_not_taken_for_replays(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=IntegrityError('boom')):
+            with self.assertRaisesMessage(IntegrityError, 'boom'):
+                self.place([(self.camera, 1)], key='key-2')
+        self.assertEqual(Order.objects.count(), 0)
+
+
+# --------------------------- Job queue ---------------------------
+
+calls = []
+
+
+@jobs.task('test_flaky')
+def flaky(fail=True):
+    calls.append('flaky')
+    if fail:
+        raise RuntimeError('flaky')
+
+
+@jobs.task('test_slow', timeout=timedelta(hours=1))
+def slow():
+    calls.append('slow')
+
+
+class JobQueueTests(RentalTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def run_due(self):
+        return jobs.process_batch(worker='test')
+
+    def test_failures_back_off_then_fail_permanently(self):
+        job = jobs.enqueue('test_flaky', max_attempts=2)
+        with self.assertLogs('rental.jobs', 'WARNING'):
+            self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(self.run_due(), 0)  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('rental.jobs', 'ERROR'):
+            self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError', job.last_error)
+
+    def test_backoff_doubles_and_is_capped(self):
+        with mock.patch('rental.jobs.random.uniform', return_value=1.0):
+            self.assertEqual([jobs.backoff(n).total_seconds() for n in (1, 2, 3)], [30, 60, 120])
+            self.assertEqual(jobs.backoff(30), timedelta(seconds=jobs.BACKOFF_MAX_SECONDS))
+
+    def test_reclaimed_lock_counts_as_an_attempt(self):
+        job = jobs.enqueue('test_flaky', max_attempts=2)
+        expired = timezone.now() - jobs.LOCK_TIMEOUT - timedelta(seconds=1)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, locked_by='dead', locked_at=expired)
+        jobs.reclaim_stale()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, locked_by='dead', locked_at=expired)
+        jobs.reclaim_stale()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_task_timeout_overrides_the_default(self):
+        job = jobs.enqueue('test_slow')
+        locked_at = timezone.now() - jobs.LOCK_TIMEOUT * 2
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, locked_by='busy', locked_at=locked_at)
+        self.assertEqual(jobs.reclaim_stale(), 0)
+
+    def test_result_of_a_reclaimed_run_is_dropped(self):
+        job = jobs.enqueue('test_flaky', fail=False)
+        claimed = jobs.claim(10, 'slow-worker')[0]
+        Job.objects.filter(pk=job.pk).update(locked_by='other-worker')
+        with self.assertLogs('rental.jobs', 'WARNING'):
+            self.assertFalse(jobs.run_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'other-worker'))
+
+    def test_workers_starting_together_queue_one_periodic_run(self):
+        jobs.schedule_periodic()
+        Job.objects.filter(periodic=True).update(status=Job.DONE)
+        jobs.schedule_periodic()
+        jobs.schedule_periodic()
+        for name in jobs._periodic:
+            self.assertEqual(Job.objects.filter(name=name, status=Job.PENDING).count(), 1, name)
+
+    def test_periodic_job_is_requeued_for_the_next_slot(self):
+        every = jobs._periodic['flush_carts']
+        slot = jobs.periodic_slot(every, timezone.now()) - every
+        jobs.enqueue_periodic('flush_carts', slot)
+        jobs.enqueue_periodic('flush_carts', slot)
+        self.assertEqual(self.run_due(), 1)
+        upcoming = Job.objects.get(name='flush_carts', status=Job.PENDING)
+        self.assertEqual(upcoming.run_after, jobs.periodic_slot(every, timezone.now()) + every)
@@ -0,0 +1,161 @@
+# type: ignore
+import hashlib
+import io
+import os
+import posixpath
+
+from django.conf import settings
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import SkipFile, StopUpload, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+from .jobs import enqueue_many
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.pdf'}
+RESIZABLE_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+RESIZABLE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+JPEG_QUALITY = 85
+
+
+def max_file_size():
+    return getattr(settings, 'REGISTRATION_MAX_FILE_SIZE', 10 * 1024 * 1024)
+
+
+def max_upload_size():
+    return getattr(settings, 'REGISTRATION_MAX_UPLOAD_SIZE', 40 * 1024 * 1024)
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools every uploaded file to a temporary file in chunks (never into
+    memory), SHA-256 hashing it on the way, and enforces a per-file and a
+    per-request size cap. Files over a cap are dropped and the reason is
+    kept in ``request.upload_errors``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.total = 0
+        if request is not None:
+            request.upload_errors = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        self.total += len(raw_data)
+        if self.total > max_upload_size():
+            self.request.upload_errors.append(
+                f"Your files are larger than {filesizeformat(max_upload_size())} in total."
+            )
+            raise StopUpload()
+        if self.size > max_file_size():
+            self.request.upload_errors.append(
+                f"{self.file_name} is larger than {filesizeformat(max_file_size())}."
+            )
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+def content_hash(file):
+    if getattr(file, 'sha256', None):
+        return file.sha256
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def store_upload(file, prefix):
+    """
+    Save an uploaded file under a content-addressed name
+    (``<prefix><aa>/<sha256><ext>``) and return that name for the FileField.
+    A file already stored is not written again. Images are stored as
+    uploaded; pass the saved row to ``queue_downscale`` to shrink them later.
+    """
+    ext = os.path.splitext(file.name)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        ext = ''
+    digest = content_hash(file)
+    # Saved even if it exists: the storage then only marks the blob as in use again.
+    return default_storage.save(f'{prefix.rstrip("/")}/{digest[:2]}/{digest}{ext}', file)
+
+
+def queue_downscale(instance, *fields):
+    """Queue a ``downscale_upload`` job for each image stored in ``instance``'s file ``fields``."""
+    payloads = []
+    for field in fields:
+        name = getattr(instance, field).name
+        if name and os.path.splitext(name)[1].lower() in RESIZABLE_EXTENSIONS:
+            payloads.append({'model': instance._meta.label, 'pk': instance.pk, 'field': field, 'name': name})
+    enqueue_many('downscale_upload', payloads)
+
+
+def downscale(file, max_side=None):
+    """
+    Shrink an image so its longer side is at most ``max_side`` pixels,
+    recompressed and without EXIF. Returns the new image as a ContentFile,
+    or None for non-images and images already small enough.
+    """
+    if Image is None:
+        return None
+    max_side = max_side or getattr(settings, 'REGISTRATION_IMAGE_MAX_SIDE', 2000)
+    try:
+        image = Image.open(file)
+        image_format = image.format
+        if image_format not in RESIZABLE_FORMATS or max(image.size) <= max_side:
+            return None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError):
+        return None
+    finally:
+        file.seek(0)
+
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = {'quality': JPEG_QUALITY, 'optimize': True} if image_format == 'JPEG' else {'optimize': True}
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def downscale_stored(model_label, pk, field, name):
+    """
+    Store a downscaled copy of the stored image ``name`` under its own
+    content hash and point the row's ``field`` at it, unless the field has
+    changed since. The original is left for ``collect_media``. Returns the
+    new name, or None if nothing changed.
+    """
+    try:
+        with default_storage.open(name) as f:
+            content = downscale(f)
+    except FileNotFoundError:
+        return None
+    if content is None:
+        return None
+    # <prefix>/<aa>/<sha><ext>: the storage adds the new <aa>/<sha>
+    prefix = posixpath.dirname(posixpath.dirname(name))
+    new_name = default_storage.save(posixpath.join(prefix, posixpath.basename(name)), content)
+    model = apps.get_model(model_label)
+    if not model._base_manager.filter(pk=pk, **{field: name}).update(**{field: new_name}):
+        return None
+    return new_name
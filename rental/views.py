@@ -1,33 +1,72 @@
 # type: ignore
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
-from datetime import datetime
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from datetime import datetime, timedelta
+from functools import wraps
+import uuid
+from django.utils import timezone
+from django.conf import settings
+from django.views.static import serve as static_serve
 
 from .models import Product, Category, Brand, WishlistItem, Order, OrderItem
 from .forms import IndividualRegistrationForm, CorporateRegistrationForm, StudioRegistrationForm
 from django.contrib.auth.forms import UserCreationForm
 from .forms import IndividualRegistrationForm, CorporateRegistrationForm, StudioRegistrationForm
 from .models import IndividualProfile, CorporateProfile, StudioProfile
-
-
-# Group checker
+from .search import search_products
+from .pagination import KeysetPaginator, InvalidCursor
+from . import analytics, catalog_cache, exports
+from .popularity import record_order, top_products
+from .availability import BookingConflict, reserve, filter_available
+from .cart import Cart, CartFull
+from .archive import order_history_page
+from . import wishlist
+from .wishlist import wishlist_ids
+from .uploads import HashingUploadHandler
+from .roles import get_roles
+from .profiles import resolve_profile
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+from .jobs import enqueue
+from .catalog_cache import params_key
+
+
+# Group checker; membership comes from the session role cache
 def in_group(group_name):
-    def check(user):
-        return user.is_authenticated and user.groups.filter(name=group_name).exists()
-    return user_passes_test(check)
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if group_name in get_roles(request):
+                return view(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wrapped
+    return decorator
 
 
 # --------------------------- Auth Views ---------------------------
 
+@csrf_exempt
 def register_view(request):
+    # Upload handlers must be set before CSRF checking reads request.POST.
+    request.upload_handlers = [HashingUploadHandler(request)]
+    return _register_view(request)
+
+
+@csrf_protect
+def _register_view(request):
     account_type = request.GET.get('type', 'individual')
     
     if request.method == 'POST':
+        for error in getattr(request, 'upload_errors', []):
+            messages.error(request, error)
         # Initialize the appropriate form based on account_type
         if account_type == 'individual':
             form = IndividualRegistrationForm(request.POST, request.FILES)
@@ -38,7 +77,8 @@ def register_view(request):
         
         if form.is_valid():
             try:
-                user = form.save()
+                with transaction.atomic():
+                    user = form.save()
                 login(request, user)
                 messages.success(request, "Registration successful! Welcome to RentHub.")
                 return redirect('home')
@@ -84,33 +124,106 @@ def user_logout(request):
 
 @login_required(login_url='login')
 def account_view(request):
-    return render(request, 'rental/account.html', {'user': request.user})
+    return render(request, 'rental/account.html', {'user': request.user, 'account_profile': resolve_profile(request)})
 
 
 # --------------------------- General Views ---------------------------
 
-def home(request):
-    categories = Category.objects.all()
-    brands = Brand.objects.all()
-    all_products = Product.objects.all()
+CATALOG_PAGE_SIZE = 24
 
-    filtered_products = all_products
+CATALOG_ORDERINGS = {
+    'newest': ('-id',),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+    'name': ('name', 'id'),
+    'relevance': ('search_rank', 'id'),
+}
+
+
+def parse_date_range(start, end):
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end or start, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None, None
+    if end_date < start_date or start_date < timezone.localdate():
+        return None, None
+    return start_date, end_date
+
+
+def filter_catalog(request):
+    """Apply the search/category/brand/sort query params shared by the catalog grids."""
+    products = Product.objects.select_related('category', 'brand').prefetch_related('image_derivatives')
     search_query = request.GET.get('search', '')
     category_id = request.GET.get('category')
     brand_id = request.GET.get('brand')
 
     if search_query:
-        filtered_products = filtered_products.filter(name__icontains=search_query)
+        products = search_products(products, search_query)
     if category_id:
-        filtered_products = filtered_products.filter(category__id=category_id)
+        products = products.filter(category__id=category_id)
     if brand_id:
-        filtered_products = filtered_products.filter(brand__id=brand_id)
+        products = products.filter(brand__id=brand_id)
+
+    start_date, end_date = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+    if start_date:
+        products = filter_available(products, start_date, end_date)
+
+    sort = request.GET.get('sort') or ('relevance' if search_query else 'newest')
+    if sort not in CATALOG_ORDERINGS or (sort == 'relevance' and not search_query):
+        sort = 'newest'
+    return products, CATALOG_ORDERINGS[sort]
+
+
+def catalog_page(request, version=None):
+    """
+    Keyset page for the current filters. Browse pages are cached per catalog
+    version; text searches and date filters always hit their indexes.
+    """
+    params = request.GET.dict()
+    if not (params.get('search') or params.get('start')):
+        key = params_key('page', params)
+        return catalog_cache.cached(key, lambda: _catalog_page(request), version)
+    return _catalog_page(request)
+
+
+def _catalog_page(request):
+    products, ordering = filter_catalog(request)
+    paginator = KeysetPaginator(products, ordering, per_page=CATALOG_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        page.next_query = params.urlencode()
+    return page
+
+
+BEST_SELLERS_TTL = 300
+
+
+def load_best_sellers(limit=10):
+    products = top_products(limit=limit)
+    if len(products) < limit:
+        # Young catalogs: pad with the newest products.
+        seen = [p.id for p in products]
+        products += list(Product.objects.exclude(id__in=seen).order_by('-id')[:limit - len(products)])
+    prefetch_related_objects(products, 'image_derivatives')
+    return products
+
+
+def home(request):
+    version = catalog_cache.current_version()
+    best_sellers = catalog_cache.cached('best_sellers', load_best_sellers, version, timeout=BEST_SELLERS_TTL)
 
     context = {
-        'products': filtered_products,
-        'best_sellers': all_products[:10],
-        'categories': categories,
-        'brands': brands,
+        'best_sellers': best_sellers,
+        'categories': catalog_cache.get_categories(version),
+        'brands': catalog_cache.get_brands(version),
+        'catalog_version': version,
     }
     return render(request, 'rental/home.html', context)
 
@@ -120,26 +233,20 @@ def about_view(request):
 
 
 def gallery_view(request):
-    search_query = request.GET.get('search', '')
-    category_id = request.GET.get('category')
-    brand_id = request.GET.get('brand')
+    version = catalog_cache.current_version()
 
-    products = Product.objects.all()
-
-    if search_query:
-        products = products.filter(Q(name__icontains=search_query) | Q(description__icontains=search_query))
-    if category_id:
-        products = products.filter(category__id=category_id)
-    if brand_id:
-        products = products.filter(brand__id=brand_id)
+    return render(request, 'rental/gallery.html', {
+        'products': catalog_page(request, version),
+        'categories': catalog_cache.get_categories(version),
+        'brands': catalog_cache.get_brands(version),
+        'catalog_version': version,
+    })
 
-    categories = Category.objects.all()
-    brands = Brand.objects.all()
 
-    return render(request, 'rental/gallery.html', {
-        'products': products,
-        'categories': categories,
-        'brands': brands,
+def gallery_fragment(request):
+    """Next page of gallery cards for infinite scroll."""
+    return render(request, 'rental/partials/product_cards.html', {
+        'products': catalog_page(request),
     })
 
 
@@ -164,72 +271,80 @@ def wishlist_view(request):
 
 @login_required
 def add_to_wishlist(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
-    wishlist_item, created = WishlistItem.objects.get_or_create(user=request.user, product=product)
-
-    if created:
+    if product_id in wishlist_ids(request.user):
+        messages.info(request, "Item is already in your wishlist.")
+    elif wishlist.add_many(request.user, [product_id]):
         messages.success(request, "Item added successfully ✅")
     else:
-        messages.info(request, "Item is already in your wishlist.")
+        raise Http404("No such product")
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 
 @login_required
 def remove_from_wishlist(request, item_id):
-    item = get_object_or_404(WishlistItem, pk=item_id, user=request.user)
-    item.delete()
+    if WishlistItem.objects.filter(pk=item_id, user=request.user).delete()[0]:
+        wishlist.invalidate(request.user.id)
     return redirect('wishlist')
 
 
+def _wishlist_bulk_response(request, message, **data):
+    if request.headers.get('Accept', '').startswith('application/json'):
+        return JsonResponse({**data, 'wishlist': sorted(wishlist_ids(request.user))})
+    messages.success(request, message)
+    return redirect(request.META.get('HTTP_REFERER', 'wishlist'))
+
+
+@login_required
+@require_POST
+def wishlist_bulk_add(request):
+    added = wishlist.add_many(request.user, wishlist.parse_ids(request.POST.getlist('product_ids')))
+    return _wishlist_bulk_response(request, f"{added} item(s) added to your wishlist.", added=added)
+
+
+@login_required
+@require_POST
+def wishlist_bulk_remove(request):
+    removed = wishlist.remove_many(request.user, wishlist.parse_ids(request.POST.getlist('product_ids')))
+    return _wishlist_bulk_response(request, f"{removed} item(s) removed from your wishlist.", removed=removed)
+
+
+@login_required
+@require_POST
+def wishlist_move_to_cart(request):
+    """Move the given wishlist items (all of them without ``product_ids``) to the cart."""
+    current = wishlist_ids(request.user)
+    requested = wishlist.parse_ids(request.POST.getlist('product_ids'))
+    ids = [i for i in requested if i in current] if requested else sorted(current)
+    try:
+        Cart(request).add_many(ids)
+    except CartFull as e:
+        messages.error(request, str(e))
+        return redirect(request.META.get('HTTP_REFERER', 'wishlist'))
+    moved = wishlist.remove_many(request.user, ids)
+    return _wishlist_bulk_response(request, f"{moved} item(s) moved to your cart.", moved=moved)
+
+
 # --------------------------- Cart Views ---------------------------
 
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart = request.session.get('cart', {})
-    key = str(product_id)
-
-    if key in cart:
-        if isinstance(cart[key], dict):
-            cart[key]['quantity'] += 1
-        else:
-            cart[key] = {'quantity': cart[key] + 1, 'price': float(product.price), 'rental_days': 1}
+    try:
+        Cart(request).add(product.id)
+    except CartFull as e:
+        messages.error(request, str(e))
     else:
-        cart[key] = {'quantity': 1, 'price': float(product.price), 'rental_days': 1}
-
-    request.session['cart'] = cart
-    messages.success(request, "Item added successfully ✅")
+        messages.success(request, "Item added successfully ✅")
     return redirect('home')
 
 
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
-
-    for product_id, item in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            continue
-
-        if not isinstance(item, dict):
-            continue
-
-        quantity = item.get('quantity', 1)
-        price = float(item.get('price', product.price))
-        rental_days = int(item.get('rental_days', 1))
-        subtotal = price * quantity * rental_days
-
-        cart_items.append({
-            'product': product,
-            'quantity': quantity,
-            'rental_days': rental_days,
-            'subtotal': subtotal
-        })
-        total += subtotal
+    cart = Cart(request)
+    total = cart.total
 
     context = {
-        'cart_items': cart_items,
+        'cart_items': cart.lines,
+        'subtotal': total,
+        'delivery_fee': 0,
         'total': total,
         'message': request.GET.get('message')
     }
@@ -238,43 +353,84 @@ def cart_view(request):
 
 @require_POST
 def update_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    key = str(product_id)
-    new_quantity = int(request.POST.get('quantity', 1))
-
-    if key in cart:
-        if new_quantity > 0:
-            if isinstance(cart[key], dict):
-                cart[key]['quantity'] = new_quantity
-            else:
-                cart[key] = {'quantity': new_quantity, 'price': 0, 'rental_days': 1}
-        else:
-            del cart[key]
-
-    request.session['cart'] = cart
-    messages.success(request, "Cart updated successfully.")
+    try:
+        new_quantity = int(request.POST.get('quantity', 1))
+    except ValueError:
+        new_quantity = 1
+    try:
+        Cart(request).update(product_id, new_quantity)
+    except CartFull as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, "Cart updated successfully.")
     return redirect('cart')
 
 
 @require_POST
 def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    key = str(product_id)
-
-    if key in cart:
-        del cart[key]
-
-    request.session['cart'] = cart
+    Cart(request).remove(product_id)
     messages.success(request, "Item removed from your cart.")
     return redirect('cart')
 
 
 # --------------------------- Checkout ---------------------------
 
+def get_idempotency_key(request):
+    key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+    return key.strip()[:64] if key and key.strip() else None
+
+
+def place_cart_order(user, cart, start_date, end_date, idempotency_key=None, **delivery):
+    """
+    Write the order, its items and the unit reservations as one transaction.
+    Returns ``(order, created)``; a repeated ``idempotency_key`` returns the
+    order written by the first submission.
+    """
+    rental_days = (end_date - start_date).days or 1
+    lines = cart.lines
+    total_price = sum((line.product.price * line.quantity * rental_days for line in lines), 0)
+    first_product = lines[0].product if lines else None
+
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user,
+                start_date=start_date,
+                end_date=end_date,
+                total_price=total_price,
+                idempotency_key=idempotency_key,
+                item_count=sum(line.quantity for line in lines),
+                first_product_name=first_product.name if first_product else '',
+                first_product_image=first_product.image.name if first_product else '',
+                **delivery
+            )
+            items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+                for line in lines
+            ])
+            reserve([(line.product, line.quantity) for line in lines], start_date, end_date)
+            record_order(order, items)
+            enqueue('order_placed', order_id=order.id)
+    except IntegrityError:
+        # Only a replayed key is expected here; anything else is a real error.
+        existing = None
+        if idempotency_key is not None:
+            existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
+
+
 @login_required
 def checkout(request):
-    cart = request.session.get('cart', {})
-    if not cart:
+    idempotency_key = get_idempotency_key(request) if request.method == 'POST' else None
+    if idempotency_key and Order.objects.filter(user=request.user, idempotency_key=idempotency_key).exists():
+        # Double-click or retry of a submission that already went through.
+        return redirect('my_orders')
+
+    cart = Cart(request)
+    if not cart.lines:
         messages.success(request, "Your order has been placed!")
         return redirect('my_orders')
 
@@ -285,6 +441,9 @@ def checkout(request):
         except Exception:
             messages.error(request, "Invalid rental dates.")
             return redirect('checkout')
+        if start_date < timezone.localdate() or end_date < start_date:
+            messages.error(request, "Rentals must start today or later and end after the start date.")
+            return redirect('checkout')
 
         delivery_option = request.POST.get('delivery_option')
         name = request.POST.get('full_name')
@@ -294,84 +453,39 @@ def checkout(request):
         zip_code = request.POST.get('zip_code')
 
         is_delivery = (delivery_option == 'delivery')
-        total_price = 0
-
-        order = Order.objects.create(
-            user=request.user,
-            start_date=start_date,
-            end_date=end_date,
-            is_delivery=is_delivery,
-            delivery_name=name if is_delivery else '',
-            delivery_phone=phone if is_delivery else '',
-            delivery_address=address if is_delivery else '',
-            city=city if is_delivery else '',
-            zip_code=zip_code if is_delivery else '',
-            total_price=0
-        )
-
-        for product_id, item in cart.items():
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                continue
 
-            if not isinstance(item, dict):
-                continue
-
-            quantity = int(item.get('quantity', 1))
-            price = float(item.get('price', product.price))
-            rental_days = (end_date - start_date).days or 1
-
-            total_price += price * quantity * rental_days
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
+        try:
+            order, created = place_cart_order(
+                request.user, cart, start_date, end_date,
+                idempotency_key=idempotency_key,
+                is_delivery=is_delivery,
+                delivery_name=name if is_delivery else '',
+                delivery_phone=phone if is_delivery else '',
+                delivery_address=address if is_delivery else '',
+                city=city if is_delivery else '',
+                zip_code=zip_code if is_delivery else '',
             )
+        except BookingConflict as conflict:
+            messages.error(request, str(conflict))
+            return redirect('checkout')
 
-        order.total_price = total_price
-        order.save()
-
-        request.session['cart'] = {}
-        messages.success(request, "Your order has been placed!")
+        cart.clear()
+        if created:
+            messages.success(request, "Your order has been placed!")
         return redirect('my_orders')
 
     # GET request - show checkout page
-    cart_items = []
-    subtotal = 0
-    for product_id, item in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            continue
-
-        if not isinstance(item, dict):
-            continue
-
-        quantity = item.get('quantity', 1)
-        rental_days = item.get('rental_days', 1)
-        price = float(item.get('price', product.price))
-        total = quantity * rental_days * price
-        subtotal += total
-
-        cart_items.append({
-            'id': product_id,
-            'product': product,
-            'quantity': quantity,
-            'rental_days': rental_days,
-            'total_price': total,
-        })
-
+    subtotal = cart.total
     delivery_fee = 0
     total = subtotal + delivery_fee
 
     return render(request, 'rental/checkout.html', {
-        'cart_items': cart_items,
+        'cart_items': cart.lines,
         'subtotal': subtotal,
         'delivery_fee': delivery_fee,
-        'total': total
+        'total': total,
+        'idempotency_key': uuid.uuid4().hex,
+        'account_profile': resolve_profile(request),
     })
 
 
@@ -385,25 +499,110 @@ def place_order(request):
 
 # ❌ Clear Cart
 def clear_cart(request):
-    request.session['cart'] = {}
+    Cart(request).clear()
     messages.info(request, "Your cart has been cleared.")
     return redirect('cart')
 
 
-@login_required
-def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at').prefetch_related('items__product')
-    return render(request, 'rental/my_orders.html', {'orders': orders})
+ORDER_HISTORY_PAGE_SIZE = 20
 
 
+@login_required
+def my_orders(request):
+    """
+    Order history, newest first, keyset-paginated on (created_at, id). Reads
+    only the denormalized summary columns of Order and ArchivedOrder.
+    Add ``?format=json`` (or send ``Accept: application/json``) for JSON.
+    """
+    try:
+        page = order_history_page(request.user, request.GET.get('cursor'), ORDER_HISTORY_PAGE_SIZE)
+    except InvalidCursor:
+        page = order_history_page(request.user, per_page=ORDER_HISTORY_PAGE_SIZE)
+
+    if request.GET.get('format') == 'json' or 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'orders': [{
+                'id': order.id,
+                'created_at': order.created_at.isoformat(),
+                'start_date': order.start_date.isoformat(),
+                'end_date': order.end_date.isoformat(),
+                'status': order.status,
+                'total_price': str(order.total_price),
+                'is_delivery': order.is_delivery,
+                'item_count': order.item_count,
+                'first_product_name': order.first_product_name,
+                'first_product_image': order.first_product_image_url,
+                'archived': order.is_archived,
+            } for order in page],
+            'next_cursor': page.next_cursor,
+        })
 
+    return render(request, 'rental/my_orders.html', {'orders': page})
+
+
+REPORT_DEFAULT_DAYS = 90
+
+
+@staff_member_required
+def reports_view(request):
+    """Revenue and utilization from the RentalFact rollups; never scans orders."""
+    group = request.GET.get('group') if request.GET.get('group') in analytics.DIMENSIONS else 'category'
+    period = request.GET.get('period') if request.GET.get('period') in analytics.PERIODS else 'month'
+    try:
+        end = datetime.strptime(request.GET.get('end', ''), "%Y-%m-%d").date()
+    except ValueError:
+        end = timezone.localdate()
+    try:
+        start = datetime.strptime(request.GET.get('start', ''), "%Y-%m-%d").date()
+    except ValueError:
+        start = end - timedelta(days=REPORT_DEFAULT_DAYS)
+    start = min(start, end)
+
+    return render(request, 'rental/reports.html', {
+        'rows': analytics.report(group, period, start, end),
+        'group': group,
+        'period': period,
+        'start': start,
+        'end': end,
+        'groups': list(analytics.DIMENSIONS),
+        'periods': list(analytics.PERIODS),
+    })
 
 
+@staff_member_required
+def export_view(request, name):
+    """
+    Stream an export as CSV (default) or ``?format=jsonl``, optionally
+    limited with ``?start=``/``?end=`` and gzipped with ``?gzip=1``.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404("Unknown export")
+    start = end = None
+    try:
+        if request.GET.get('start'):
+            start = datetime.strptime(request.GET['start'], "%Y-%m-%d").date()
+        if request.GET.get('end'):
+            end = datetime.strptime(request.GET['end'], "%Y-%m-%d").date()
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+    gzip = request.GET.get('gzip') == '1'
+
+    response = StreamingHttpResponse(
+        exports.stream_export(name, fmt, start, end, gzip),
+        content_type='application/gzip' if gzip else f'{exports.FORMATS[fmt]}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exports.export_filename(name, fmt, gzip)}"'
+    return response
+
+
+def serve_media(request, path):
+    """Development media server; content-addressed files are cached for good."""
+    response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
 
-@login_required
-def my_orders (request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'rental/my_orders.html', {'orders': orders})
 
 def contact_view(request):
     return render(request, 'rental/contact.html')
\ No newline at end of file
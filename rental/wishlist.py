@@ -0,0 +1,96 @@
+# type: ignore
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .catalog_cache import FileVersionStore
+from .models import Product, WishlistItem
+
+
+# Bounds staleness if a change ever bypasses invalidate()
+WISHLIST_TTL = 60 * 60
+
+
+def get_cache():
+    return caches[getattr(settings, 'WISHLIST_CACHE_ALIAS', 'default')]
+
+
+def get_version_store(user_id):
+    root = getattr(settings, 'WISHLIST_VERSION_DIR', settings.BASE_DIR / '.wishlist_versions')
+    return FileVersionStore(os.path.join(root, str(user_id)))
+
+
+def cache_key(user_id, version):
+    return f'wishlist:ids:{user_id}:{version}'
+
+
+def wishlist_ids(user):
+    """
+    The set of product ids on ``user``'s wishlist: one query on a miss,
+    none afterwards. Entries are keyed by the user's wishlist version, kept
+    in a FileVersionStore, so invalidate() reaches every process even when
+    the cache itself is per-process.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    key = cache_key(user.id, get_version_store(user.id).get())
+    ids = get_cache().get(key)
+    if ids is None:
+        ids = frozenset(WishlistItem.objects.filter(user=user).values_list('product_id', flat=True))
+        get_cache().set(key, ids, WISHLIST_TTL)
+    return ids
+
+
+def invalidate(user_id):
+    # After commit, so no request can cache the old rows under the new version.
+    transaction.on_commit(get_version_store(user_id).bump)
+
+
+def parse_ids(values):
+    """Product ids from a list of strings, ignoring anything that is not a number."""
+    ids = set()
+    for value in values:
+        for part in str(value).split(','):
+            if part.strip().isdigit():
+                ids.add(int(part))
+    return sorted(ids)
+
+
+def add_many(user, product_ids):
+    """
+    Add products to the wishlist with one INSERT ... SELECT: unknown ids are
+    skipped by the join on Product and existing rows by the unique
+    constraint. Returns the number of rows added.
+    """
+    if not product_ids:
+        return 0
+    qn = connection.ops.quote_name
+    fields = ['user_id', 'product_id', 'added_at']
+    sql = '%s %s (%s) SELECT %%s, %s, %%s FROM %s WHERE %s IN (%s) %s' % (
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        qn(WishlistItem._meta.db_table),
+        ', '.join(qn(f) for f in fields),
+        qn('id'),
+        qn(Product._meta.db_table),
+        qn('id'),
+        ', '.join(['%s'] * len(product_ids)),
+        connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.id, timezone.now(), *product_ids])
+        added = cursor.rowcount
+    invalidate(user.id)
+    return added
+
+
+def remove_many(user, product_ids):
+    """Remove products from the wishlist with one DELETE. Returns the number removed."""
+    if not product_ids:
+        return 0
+    removed, _ = WishlistItem.objects.filter(user=user, product_id__in=product_ids).delete()
+    invalidate(user.id)
+    return removed